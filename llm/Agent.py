@@ -1,37 +1,121 @@
 import os
 import asyncio
 import json
-from typing import List, Tuple, Dict
+from collections import Counter
+from typing import List, Tuple, Dict, Optional, Callable
 
 from openai import AsyncOpenAI
 from aiolimiter import AsyncLimiter
 from dotenv import load_dotenv
 
 from .llm_error import ResponseParseError
+from .transport import build_http_client, RequestTiming
+from .voting import is_call_failure, is_low_confidence, parse_full_score, pick_verdict
+from .compact_answer import compact_answer, estimate_tokens
 
 load_dotenv()
 
 class Agent:
-    def __init__(self, model_name: str, base_url: str, rate_limit: AsyncLimiter):
+    """
+    基于 AsyncOpenAI 的批改 Agent。
+
+    所有请求共享一个显式配置的 httpx 客户端（见 build_http_client），
+    请使用 `async with Agent(...) as grader:` 或在结束时调用 aclose() 以关闭连接池。
+
+    Args:
+        model_name: 模型名称
+        base_url: OpenAI 兼容接口地址
+        rate_limit: 请求限流器
+        api_key: API Key，默认读取环境变量 DASHSCOPE_API_KEY
+        max_connections: 连接池上限，同时也是进行中请求数的上限；
+            grade_sequence 等调度器会一次性发起全部题目，超出的请求在 Agent 内排队，而不是在连接池中等待直至 PoolTimeout
+        connect_timeout / read_timeout: 建立连接与读取响应的超时（秒）
+        request_deadline: 单次请求的总时限（秒，不含在并发上限处排队的时间），None 表示不限制
+        http2: 是否启用 HTTP/2
+        on_request_timing: 每个 HTTP 请求完成后的耗时回调，用于性能统计
+        compact: 是否在发送前压缩答案（见 compact_answer），压缩前后的估计 tokens 记录在 compaction_records；
+            默认关闭，开启前先用 bench_compaction 在真实答案上确认批改结果不变
+        drop_comments: 压缩时是否删除纯注释行；题目要求在注释中作答时应设为 False
+        vote_samples: 低置信度结果（部分得分或无法解析）的最多采样次数，1 表示不投票
+        vote_agreement: 某个分数获得的票数达到该值即提前停止采样
+        vote_temperature: 投票采样时使用的 temperature，None 表示使用服务端默认值
+    """
+    def __init__(self, model_name: str, base_url: str, rate_limit: AsyncLimiter, api_key: Optional[str] = None,
+                 max_connections: int = 32,
+                 connect_timeout: float = 10.0,
+                 read_timeout: float = 120.0,
+                 request_deadline: Optional[float] = 180.0,
+                 http2: bool = False,
+                 on_request_timing: Optional[Callable[[RequestTiming], None]] = None,
+                 compact: bool = False,
+                 drop_comments: bool = True,
+                 vote_samples: int = 1,
+                 vote_agreement: int = 2,
+                 vote_temperature: Optional[float] = None):
+        self.http_client = build_http_client(
+            max_connections=max_connections,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            http2=http2,
+            on_timing=on_request_timing,
+        )
         self.client = AsyncOpenAI(
-            api_key=os.getenv("DASHSCOPE_API_KEY"),
-            base_url=base_url
+            api_key=api_key or os.getenv("DASHSCOPE_API_KEY"),
+            base_url=base_url,
+            http_client=self.http_client,
+            timeout=self.http_client.timeout,
         )
         self.question_dir = "./data/tasks"
         self.model_name = model_name
         self.rate_limit = rate_limit
+        self.request_deadline = request_deadline
+        self._slots = asyncio.Semaphore(max_connections)
         self.try_again_time = 1
+        self.compact = compact
+        self.drop_comments = drop_comments
+        self.compaction_records: List[Tuple[str, int, int]] = []
+        self._references: Dict[int, List[str]] = {}
+        self.vote_samples = vote_samples
+        self.vote_agreement = vote_agreement
+        self.vote_temperature = vote_temperature
+        self.vote_records: List[Tuple[str, int, List[Optional[int]]]] = []
+
+    async def __aenter__(self) -> "Agent":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """关闭共享的 HTTP 连接池"""
+        await self.client.close()
 
     async def ainvoke(self,
             answer_file_path: str,
-            question_num: int) -> Tuple[bool, int, str, int]:
+            question_num: int,
+            compact: Optional[bool] = None) -> Tuple[bool, int, str, int]:
         
         answer = self._read(answer_file_path)
         question, solution, score = self._read_question(question_num)
+        if self.compact if compact is None else compact:
+            answer = self._compact(answer_file_path, answer, question_num)
+
+        verdict = await self._ainvoke_once(question=question, solution=solution, score=score, answer=answer)
+        if self.vote_samples > 1 and is_low_confidence(verdict, parse_full_score(score)):
+            verdict = await self._vote(verdict, answer_file_path, question_num,
+                                       question=question, solution=solution, score=score, answer=answer)
+        return verdict
 
+    async def _ainvoke_once(self,
+            question: str,
+            solution: str,
+            score: str,
+            answer: str,
+            temperature: Optional[float] = None) -> Tuple[bool, int, str, int]:
         for attempt in range(self.try_again_time + 1):
             try:
-                completion = await self._invoke(question=question,solution=solution,score=score,answer=answer)
+                completion = await self._invoke(question=question,solution=solution,score=score,answer=answer,
+                                                temperature=temperature)
         
                 return self._process_response(completion)
             
@@ -44,15 +128,42 @@ class Agent:
                         return (False,None,f"{e}. 原始输出: {e.raw_output}",e.tokens,)
                     else:
                         return False, None, f"多次调用失败: {e}", 0
+
+    async def _vote(self, first, answer_file_path: str, question_num: int, **prompt) -> Tuple[bool, int, str, int]:
+        """
+        对低置信度的结果追加采样，直到某个分数获得 vote_agreement 票或采样数达到 vote_samples。
+        每轮只追加达成一致所需的最少次数，并发进行；追加的采样出现调用失败时停止。
+        """
+        verdicts = [first]
+        while len(verdicts) < self.vote_samples:
+            counts = Counter(v[1] for v in verdicts if v[1] is not None)
+            top = max(counts.values(), default=0)
+            if top >= self.vote_agreement:
+                break
+            need = min(self.vote_agreement - top, self.vote_samples - len(verdicts))
+            samples = await asyncio.gather(
+                *(self._ainvoke_once(**prompt, temperature=self.vote_temperature) for _ in range(need))
+            )
+            verdicts.extend(samples)
+            if any(is_call_failure(v) for v in samples):
+                break
+
+        self.vote_records.append((answer_file_path, question_num, [v[1] for v in verdicts]))
+        return pick_verdict(verdicts)
     
     async def _invoke(self,
             question: str,
             solution: str,
             score: str,
-            answer: str):
-        async with self.rate_limit:
-            completion = await self.client.chat.completions.create(
+            answer: str,
+            temperature: Optional[float] = None):
+        # 仅在投票采样时显式传入 temperature，其余请求沿用服务端默认值
+        extra = {} if temperature is None else {"temperature": temperature}
+        # 先占用并发名额再进入限流器，排队中的请求不消耗限流额度
+        async with self._slots, self.rate_limit:
+            completion = await asyncio.wait_for(self.client.chat.completions.create(
                 model=self.model_name,
+                **extra,
                 messages=[
                     {
             "role": "system",
@@ -93,7 +204,7 @@ class Agent:
                         有一位同学的mlx文件与对应的m函数文件答案是：
                         {answer}
                     """}],
-                )
+                ), timeout=self.request_deadline)
             return completion
         
     @staticmethod
@@ -120,6 +231,27 @@ class Agent:
             self._read(os.path.join(current_question_dir,'score'))
         )
     
+    def _compact(self, answer_file_path: str, answer: str, question_num: int) -> str:
+        compacted = compact_answer(answer, references=self._read_references(question_num),
+                                   drop_comments=self.drop_comments)
+        self.compaction_records.append((answer_file_path, estimate_tokens(answer), estimate_tokens(compacted)))
+        return compacted
+
+    def _read_references(self, question_num: int) -> List[str]:
+        """
+        读取用于判断依赖函数是否未经修改的 .m 文件（每项为一个完整文件）：
+        题目目录下的参考答案 .m 文件，以及 question_dir/template 下的模板 .m 文件
+        """
+        if question_num not in self._references:
+            current_question_dir = os.path.join(self.question_dir, str(question_num))
+            references = []
+            for folder in (current_question_dir, os.path.join(self.question_dir, 'template')):
+                if os.path.isdir(folder):
+                    references.extend(self._read(os.path.join(folder, fn))
+                                      for fn in sorted(os.listdir(folder)) if fn.endswith('.m'))
+            self._references[question_num] = references
+        return self._references[question_num]
+
     def _process_response(self, completion):
         raw_output = completion.choices[0].message.content.strip()
         try:
@@ -132,4 +264,10 @@ class Agent:
             f"解析模型输出失败: {e}",
             raw_output,
             int(completion.usage.total_tokens),
+        )
+        # JSON 合法但不是三元素列表，同样视为无法解析
+        raise ResponseParseError(
+            "解析模型输出失败: 输出不是三元素列表",
+            raw_output,
+            int(completion.usage.total_tokens),
         )
\ No newline at end of file
@@ -0,0 +1,215 @@
+import re
+import csv
+import os
+import textwrap
+from typing import Iterable, List, Optional, Tuple
+
+# 视为程序输出（而非代码）的代码块语言标记
+OUTPUT_FENCES = {"matlabtextoutput", "text", "plaintext", "output"}
+
+_DEPENDENCY_PATTERN = re.compile(r"% === Dependency: (\S+?)\.m ===\n```matlab(.*?)```", re.DOTALL)
+_IMAGE_PATTERN = re.compile(r"^\s*!\[[^\]]*\]\([^)]*\)\s*$")
+_BOILERPLATE_PATTERN = re.compile(r"^\s*((clc|clear(\s+all)?|close\s+all|format\s+\w+)\s*[;,]?\s*)+$")
+_CJK_PATTERN = re.compile(r"[　-鿿＀-￯]")
+
+
+def compact_answer(answer: str,
+                   references: Iterable[str] = (),
+                   head_lines: int = 10,
+                   tail_lines: int = 5,
+                   max_line_chars: int = 200,
+                   drop_comments: bool = True) -> str:
+    """
+    压缩 answer.md 以减少发送给模型的 tokens：
+    - 程序输出只保留开头 head_lines 行与结尾 tail_lines 行，过长的行截断
+    - 图片占位合并为一行 [figure]
+    - 删除纯注释行与 clc / clear / close all 等样板语句，并去除代码块的公共缩进
+    - 与某个模板或参考答案 .m 文件完全相同（忽略注释、空行与多余空白）的依赖函数文件替换为一行说明；
+      只比较整个文件，无法可靠判断时保留原代码
+
+    Args:
+        answer: answer.md 的内容
+        references: 模板与参考答案 .m 文件的源码（每项为一个完整文件），用于判断依赖函数文件是否未经修改
+        head_lines / tail_lines: 每段输出保留的首尾行数
+        max_line_chars: 单行最大字符数
+        drop_comments: 是否删除纯注释行（若题目要求在注释中作答，应设为 False）
+
+    Returns:
+        压缩后的文本
+    """
+    normalized_refs = {_normalize_code(ref) for ref in references} - {None, ""}
+
+    def replace_dependency(match: re.Match) -> str:
+        name, code = match.group(1), match.group(2)
+        normalized = _normalize_code(code)
+        if normalized and normalized in normalized_refs:
+            return f"% === Dependency: {name}.m ===（与模板/参考答案相同，已省略）"
+        # 原始依赖块中 ```matlab 与源码之间可能没有换行，这里补齐以便后续按代码块压缩
+        code = code.strip("\n")
+        return f"% === Dependency: {name}.m ===\n```matlab\n{code}\n```"
+
+    answer = _DEPENDENCY_PATTERN.sub(replace_dependency, answer)
+
+    lines: List[str] = []
+    block: List[str] = []
+    fence = None  # None: 代码块外；"code" / "output": 代码块内
+
+    for line in answer.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            if fence is None:
+                lang = stripped[3:].strip().lower()
+                fence = "output" if lang in OUTPUT_FENCES else "code"
+                lines.append(stripped)
+                block = []
+                continue
+            if fence == "code":
+                lines.extend(_compact_code(block, drop_comments).splitlines())
+            else:
+                lines.extend(_compact_output(block, head_lines, tail_lines, max_line_chars))
+            lines.append("```")
+            fence = None
+            continue
+
+        if fence is not None:
+            block.append(line)
+        elif _IMAGE_PATTERN.match(line):
+            if not lines or lines[-1] != "[figure]":
+                lines.append("[figure]")
+        else:
+            lines.append(_truncate(line.rstrip(), max_line_chars))
+
+    # 未闭合的代码块按原样保留
+    if fence is not None:
+        lines.extend(block)
+
+    text = "\n".join(lines)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计 tokens 数：中文字符按 1 个 token，其余按 4 个字符 1 个 token"""
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def summarize_compaction(records: List[Tuple[str, int, int]]) -> str:
+    """
+    汇总 (answer_path, 压缩前 tokens, 压缩后 tokens) 记录
+    """
+    if not records:
+        return "🔹 未进行答案压缩"
+    before = sum(r[1] for r in records)
+    after = sum(r[2] for r in records)
+    ratio = 1 - after / before if before else 0.0
+    return (f"🔹 答案压缩: {len(records)} 份, 估计 tokens {before} → {after} "
+            f"(减少 {ratio:.1%}, 平均每份减少 {(before - after) / len(records):.0f})")
+
+
+def export_compaction_report(records: List[Tuple[str, int, int]], output_path: str) -> None:
+    """将每份答案的压缩前后 tokens 导出为 CSV"""
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(["answer_path", "tokens_before", "tokens_after", "reduction"])
+        for path, before, after in records:
+            writer.writerow([path, before, after, before - after])
+
+
+def _compact_code(lines: List[str], drop_comments: bool) -> str:
+    kept = []
+    in_block_comment = False
+    for line in lines:
+        stripped = line.strip()
+        if drop_comments:
+            if stripped == "%{":
+                in_block_comment = True
+                continue
+            if in_block_comment:
+                in_block_comment = stripped != "%}"
+                continue
+            if stripped.startswith("%"):
+                continue
+        if _BOILERPLATE_PATTERN.match(line):
+            continue
+        if not stripped and (not kept or not kept[-1].strip()):
+            continue
+        kept.append(line.rstrip())
+    return textwrap.dedent("\n".join(kept)).strip("\n")
+
+
+def _compact_output(lines: List[str], head_lines: int, tail_lines: int, max_line_chars: int) -> List[str]:
+    lines = [_truncate(line.rstrip(), max_line_chars) for line in lines if line.strip()]
+    if len(lines) <= head_lines + tail_lines + 1:
+        return lines
+    omitted = len(lines) - head_lines - tail_lines
+    return [*lines[:head_lines], f"...（省略 {omitted} 行输出）...", *lines[len(lines) - tail_lines:]]
+
+
+def _truncate(line: str, max_chars: int) -> str:
+    if len(line) <= max_chars:
+        return line
+    return f"{line[:max_chars]} ...（省略 {len(line) - max_chars} 个字符）"
+
+
+def _normalize_code(code: str) -> Optional[str]:
+    """
+    规范化一个 MATLAB 文件用于整文件比较：去除注释（字符串中的 % 不受影响）与空行，
+    字符串外的连续空白合并为一个空格。无法可靠解析（字符串未闭合）时返回 None。
+    """
+    lines = []
+    in_block_comment = False
+    for line in code.splitlines():
+        stripped = line.strip()
+        if stripped == "%{":
+            in_block_comment = True
+            continue
+        if in_block_comment:
+            in_block_comment = stripped != "%}"
+            continue
+        line = _strip_comment(line)
+        if line is None:
+            return None
+        if line:
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def _strip_comment(line: str) -> Optional[str]:
+    """去除一行 MATLAB 代码中 % 与 ... 之后的注释；字符串未闭合时返回 None"""
+    out: List[str] = []
+    quote = None
+    i = 0
+    while i < len(line):
+        ch = line[i]
+        if quote is not None:
+            out.append(ch)
+            if ch == quote:
+                # 字符串内的 '' 与 "" 为转义的引号
+                if line[i + 1:i + 2] == quote:
+                    out.append(quote)
+                    i += 2
+                    continue
+                quote = None
+        elif ch == "%" or line.startswith("...", i):
+            break
+        elif ch == '"' or (ch == "'" and not _is_transpose(line, i)):
+            quote = ch
+            out.append(ch)
+        elif ch.isspace():
+            if out and out[-1] != " ":
+                out.append(" ")
+        else:
+            out.append(ch)
+        i += 1
+    if quote is not None:
+        return None
+    return "".join(out).strip()
+
+
+def _is_transpose(line: str, i: int) -> bool:
+    """紧跟在标识符、数字、右括号、. 或 ' 之后的 ' 是转置运算符而非字符串开头"""
+    if i == 0:
+        return False
+    prev = line[i - 1]
+    return prev.isalnum() or prev in "_)]}.'"
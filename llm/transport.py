@@ -0,0 +1,97 @@
+import time
+import importlib.util
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import httpx
+
+
+@dataclass
+class RequestTiming:
+    """
+    单次 HTTP 请求的耗时记录（均为 time.perf_counter() 时间戳，单位秒）
+
+    connect 为 None 表示复用了连接池中的已有连接。
+    """
+    method: str
+    url: str
+    start: float
+    connect: Optional[float] = None
+    first_byte: Optional[float] = None
+    last_byte: Optional[float] = None
+
+    @property
+    def connect_time(self) -> Optional[float]:
+        return None if self.connect is None else self.connect - self.start
+
+    @property
+    def time_to_first_byte(self) -> Optional[float]:
+        return None if self.first_byte is None else self.first_byte - self.start
+
+    @property
+    def total_time(self) -> Optional[float]:
+        return None if self.last_byte is None else self.last_byte - self.start
+
+
+def build_http_client(
+        max_connections: int = 32,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 120.0,
+        write_timeout: float = 30.0,
+        pool_timeout: float = 30.0,
+        http2: bool = False,
+        on_timing: Optional[Callable[[RequestTiming], None]] = None) -> httpx.AsyncClient:
+    """
+    构建供 AsyncOpenAI 共享的 httpx 客户端：显式的连接池上限、分项超时、可选 HTTP/2，
+    以及通过 httpcore trace 采集的 连接 → 首字节 → 末字节 耗时
+
+    Args:
+        max_connections: 连接池最大连接数；Agent 以同样的上限限制进行中的请求数，避免排队等待连接导致 PoolTimeout
+        max_keepalive_connections: 保持存活的空闲连接数，默认等于 max_connections
+        keepalive_expiry: 空闲连接的保活时间（秒）
+        connect_timeout / read_timeout / write_timeout / pool_timeout: 分项超时（秒）
+        http2: 是否启用 HTTP/2（需要安装 h2，未安装时回退到 HTTP/1.1）
+        on_timing: 每个请求读取完响应体后的回调
+    """
+    if http2 and importlib.util.find_spec("h2") is None:
+        print("⚠️ 未安装 h2，HTTP/2 不可用，回退到 HTTP/1.1")
+        http2 = False
+
+    event_hooks = {}
+    if on_timing is not None:
+        async def attach_trace(request: httpx.Request) -> None:
+            timing = RequestTiming(method=request.method, url=str(request.url), start=time.perf_counter())
+
+            async def trace(event_name: str, info: dict) -> None:
+                now = time.perf_counter()
+                # TCP 连接与 TLS 握手均计入 connect
+                if event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                    timing.connect = now
+                elif event_name.endswith("receive_response_headers.complete"):
+                    timing.first_byte = now
+                elif (event_name.endswith("receive_response_body.complete")
+                      or event_name.endswith("response_closed.complete")) and timing.last_byte is None:
+                    timing.last_byte = now
+                    on_timing(timing)
+
+            request.extensions["trace"] = trace
+
+        event_hooks["request"] = [attach_trace]
+
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections or max_connections,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(
+            connect=connect_timeout,
+            read=read_timeout,
+            write=write_timeout,
+            pool=pool_timeout,
+        ),
+        http2=http2,
+        event_hooks=event_hooks,
+    )
@@ -0,0 +1,78 @@
+import re
+import statistics
+from collections import Counter, defaultdict
+from typing import List, Optional, Tuple
+
+Verdict = Tuple[bool, Optional[int], str, int]
+
+
+def parse_full_score(score_text: str) -> Optional[int]:
+    """从 score 文件（总分以及评分度量表）中取第一个整数作为满分"""
+    match = re.search(r"\d+", score_text)
+    return int(match.group()) if match else None
+
+
+def is_low_confidence(verdict: Verdict, full_score: Optional[int]) -> bool:
+    """
+    判断单次批改结果是否需要投票复核：
+    模型输出无法解析（分数为空但消耗了 tokens），或得到部分分数（0 < 分数 < 满分）。
+    调用失败（分数为空且 tokens 为 0）不复核，避免继续请求已经出错的服务。
+    """
+    is_correct, grade, _, _ = verdict
+    if grade is None:
+        return not is_call_failure(verdict)
+    if full_score is None:
+        return not is_correct and grade > 0
+    return 0 < grade < full_score
+
+
+def is_call_failure(verdict: Verdict) -> bool:
+    """调用失败（请求未得到模型输出）：分数为空且未消耗 tokens"""
+    return verdict[1] is None and not verdict[3]
+
+
+def pick_verdict(verdicts: List[Verdict]) -> Verdict:
+    """
+    多数投票：取票数最多的分数；平票时取最接近所有票中位数的分数。
+    返回该分数对应的第一条结果，tokens 为所有采样之和。
+    """
+    tokens = sum(v[3] or 0 for v in verdicts)
+    scored = [v for v in verdicts if v[1] is not None]
+    if not scored:
+        is_correct, grade, reason, _ = verdicts[0]
+        return is_correct, grade, reason, tokens
+
+    counts = Counter(v[1] for v in scored)
+    top = max(counts.values())
+    median = statistics.median(v[1] for v in scored)
+    winner = min((g for g, c in counts.items() if c == top), key=lambda g: (abs(g - median), g))
+    is_correct, grade, reason, _ = next(v for v in scored if v[1] == winner)
+    return is_correct, grade, reason, tokens
+
+
+def summarize_votes(records: List[Tuple[str, int, List[Optional[int]]]]) -> str:
+    """
+    按题目汇总投票记录 (answer_path, 题号, 各次采样分数)：
+    复核份数、平均调用次数、平均样本方差与多数票占比
+    """
+    if not records:
+        return "🔹 未触发投票复核"
+
+    by_question = defaultdict(list)
+    for _, question_num, scores in records:
+        by_question[question_num].append(scores)
+
+    lines = [f"🔹 投票复核: {len(records)} 份",
+             f"{'题号':<6}{'复核份数':>8}{'平均调用':>8}{'平均方差':>10}{'多数票占比':>10}"]
+    for question_num in sorted(by_question):
+        samples = by_question[question_num]
+        valid = [[s for s in scores if s is not None] for scores in samples]
+        variances = [statistics.pvariance(v) for v in valid if len(v) > 1]
+        shares = [max(Counter(v).values()) / len(v) for v in valid if v]
+        lines.append(
+            f"Q{question_num:<5}{len(samples):>8}"
+            f"{sum(len(s) for s in samples) / len(samples):>8.2f}"
+            f"{(sum(variances) / len(variances) if variances else 0.0):>10.2f}"
+            f"{(sum(shares) / len(shares) if shares else 0.0):>10.1%}"
+        )
+    return "\n".join(lines)
@@ -1,19 +1,246 @@
+"""
+MATLAB Grader Bot 命令行入口
+
+    python main.py preprocess            # 解压、转换、切分学生提交（需要 MATLAB）
+    python main.py grade                 # 批改已预处理的提交
+    python main.py grade --preprocess    # 边预处理边批改
+    python main.py summarize             # 汇总成绩并导出 CSV
+    python main.py status                # 基于 processed 目录索引查询整体批改状态
+    python main.py coordinator / worker  # 基于共享队列的分布式批改
+    python main.py bench                 # 测量各子命令的启动（导入）耗时
+    python main.py bench --compaction 20 # 对比答案压缩前后的批改一致性与 tokens
+
+各子命令在处理函数内部按需导入依赖：summarize 与 grade 不会加载 matlab.engine / rarfile，
+可以在未安装 MATLAB 的机器上运行。
+"""
+import os
+import sys
+import time
 import asyncio
+import argparse
+import statistics
+import subprocess
+from contextlib import nullcontext
+from typing import Optional
+
+# QWEN official model: --model qwen-flash --base-url https://dashscope.aliyuncs.com/compatible-mode/v1
+# POE: --model Qwen3-235B-2507-FW --base-url https://api.poe.com/v1 --rpm 500 (POE API Requests are rate-limited to 500 requests per minute per user)
+DEFAULT_MODEL = "qwen-flash"
+DEFAULT_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+
+# bench 子命令测量的各子命令依赖
+COMMAND_IMPORTS = {
+    "summarize": ["util.postprocess_grade", "util.check_file", "util.processed_index"],
+    "status": ["util.processed_index"],
+    "grade": ["aiolimiter", "llm.Agent", "util.grade_sequence"],
+    "worker": ["aiolimiter", "llm.Agent", "util.distributed_grade"],
+    "preprocess": ["util.process_raw", "matlab.engine"],
+}
+
+
+def _build_agent(args, max_connections: Optional[int] = None):
+    from aiolimiter import AsyncLimiter
+    from llm.Agent import Agent
+
+    agent = Agent(model_name=args.model, base_url=args.base_url,
+                  rate_limit=AsyncLimiter(args.rpm, 60), api_key=os.getenv(args.api_key_env),
+                  max_connections=max_connections or args.max_connections, compact=args.compact,
+                  drop_comments=not args.keep_comments,
+                  vote_samples=args.votes, vote_agreement=args.vote_agreement,
+                  vote_temperature=args.vote_temperature)
+    agent.question_dir = args.tasks_dir
+    return agent
+
+
+def _open_index(args):
+    """返回 processed 目录索引的上下文管理器；--no-index 时得到 None"""
+    if args.no_index:
+        return nullcontext()
+    from util.processed_index import ProcessedIndex
+
+    return ProcessedIndex(args.processed_dir)
+
+
+def cmd_preprocess(args) -> None:
+    from util.process_raw import process_raw
+
+    with _open_index(args) as index:
+        process_raw(overlap_mode=args.overlap, raw_dir=args.raw_dir,
+                    processed_dir=args.processed_dir, tasks_dir=args.tasks_dir, index=index)
+
+
+def cmd_grade(args) -> None:
+    async def run() -> None:
+        with _open_index(args) as index:
+            async with _build_agent(args) as grader:
+                if args.preprocess:
+                    from util.process_and_grade import process_and_grade
+                    await process_and_grade(grader=grader, overlap_mode=args.overlap, raw_dir=args.raw_dir,
+                                            processed_dir=args.processed_dir, tasks_dir=args.tasks_dir,
+                                            index=index)
+                else:
+                    from util.grade_sequence import grade_sequence
+                    await grade_sequence(grader=grader, processed_dir=args.processed_dir,
+                                         overlap_mode=args.overlap, tasks_dir=args.tasks_dir, index=index)
+
+    asyncio.run(run())
+
+
+def cmd_summarize(args) -> None:
+    from util.check_file import count_task_number
+    from util.postprocess_grade import collect_student_results, export_summary
+
+    total_questions = args.total_questions or count_task_number(args.tasks_dir)
+    with _open_index(args) as index:
+        results = collect_student_results(processed_dir=args.processed_dir, total_questions=total_questions,
+                                          index=index)
+    export_summary(results, output_path=args.output or os.path.join(args.processed_dir, "grade_summary.csv"))
+
+
+def cmd_coordinator(args) -> None:
+    from util.grade_queue import GradeQueue
+    from util.distributed_grade import run_coordinator
+
+    with _open_index(args) as index:
+        run_coordinator(GradeQueue(args.db, lease_timeout=args.lease_timeout), processed_dir=args.processed_dir,
+                        overlap_mode=args.overlap, tasks_dir=args.tasks_dir, poll_interval=args.poll_interval,
+                        index=index)
+
+
+def cmd_worker(args) -> None:
+    from util.grade_queue import GradeQueue
+    from util.distributed_grade import run_worker
+
+    async def run() -> None:
+        async with _build_agent(args, max_connections=args.concurrency) as grader:
+            await run_worker(grader, GradeQueue(args.db, lease_timeout=args.lease_timeout),
+                             processed_dir=args.processed_dir, worker_id=args.worker_id,
+                             concurrency=args.concurrency, poll_interval=args.poll_interval)
+
+    asyncio.run(run())
+
+
+def cmd_status(args) -> None:
+    """查询 processed 目录索引中的课程整体状态"""
+    from util.processed_index import ProcessedIndex
+
+    start = time.perf_counter()
+    with ProcessedIndex(args.processed_dir) as index:
+        if not args.no_refresh:
+            refreshed = index.refresh(deep=args.deep)
+            print(f"🔄 索引刷新: 学生 {refreshed['students']}，重新扫描 {refreshed['rescanned']}，"
+                  f"重新读取 grade.log {refreshed['logs']}，移除 {refreshed['removed']}")
+        status = index.status()
+    elapsed = (time.perf_counter() - start) * 1000
+
+    print(f"📋 学生 {status['students']}，已通过预处理 {status['preprocessed']}，"
+          f"已全部批改 {status['fully_graded']}，未完成 {status['incomplete']}（共 {status['missing_questions']} 题未批改）")
+    print(f"⏱️ 耗时 {elapsed:.1f} ms")
+
+
+def cmd_bench(args) -> None:
+    """在全新的解释器中导入各子命令的依赖，统计启动耗时（取中位数）；指定 --compaction 时对比答案压缩前后的批改结果"""
+    if args.compaction:
+        from util.bench_compaction import bench_compaction
+
+        async def run() -> None:
+            async with _build_agent(args) as grader:
+                await bench_compaction(grader, processed_dir=args.processed_dir, sample=args.compaction)
+
+        asyncio.run(run())
+        return
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    commands = args.commands or list(COMMAND_IMPORTS)
+    print(f"\n⏱️ 子命令启动耗时（重复 {args.repeat} 次取中位数）")
+    for command in commands:
+        modules = COMMAND_IMPORTS[command]
+        code = "import " + ", ".join(modules)
+        samples = []
+        error = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            proc = subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True, text=True)
+            elapsed = time.perf_counter() - start
+            if proc.returncode != 0:
+                error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "未知错误"
+                break
+            samples.append(elapsed)
+        if error:
+            print(f"{command:<12}不可用: {error}")
+        else:
+            print(f"{command:<12}{statistics.median(samples) * 1000:>8.1f} ms")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="MATLAB Grader Bot")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    paths = argparse.ArgumentParser(add_help=False)
+    paths.add_argument("--raw-dir", default="./data/raw")
+    paths.add_argument("--processed-dir", default="./data/processed")
+    paths.add_argument("--tasks-dir", default="./data/tasks")
+    paths.add_argument("--overlap", action="store_true", help="忽略已有结果，全部重新处理")
+    paths.add_argument("--no-index", action="store_true", help="不使用 processed 目录索引，直接遍历目录")
+
+    llm = argparse.ArgumentParser(add_help=False)
+    llm.add_argument("--model", default=DEFAULT_MODEL)
+    llm.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    llm.add_argument("--api-key-env", default="DASHSCOPE_API_KEY", help="读取 API Key 的环境变量名")
+    llm.add_argument("--rpm", type=int, default=500, help="每分钟请求数上限")
+    llm.add_argument("--max-connections", type=int, default=32,
+                     help="同时进行中的请求数（连接池大小），超出的请求排队等待")
+    llm.add_argument("--compact", action="store_true", help="发送前压缩答案（建议先用 bench --compaction 确认批改结果不变）")
+    llm.add_argument("--keep-comments", action="store_true", help="压缩时保留注释行（题目要求在注释中作答时使用）")
+    llm.add_argument("--votes", type=int, default=1, help="低置信度结果的最多采样次数，1 表示不投票")
+    llm.add_argument("--vote-agreement", type=int, default=2, help="某个分数达到该票数即停止采样")
+    llm.add_argument("--vote-temperature", type=float, default=None, help="投票采样的 temperature")
+
+    queue = argparse.ArgumentParser(add_help=False)
+    queue.add_argument("--db", default="./data/grade_queue.sqlite", help="共享队列 SQLite 文件")
+    queue.add_argument("--lease-timeout", type=float, default=300.0, help="租约超时（秒）")
+    queue.add_argument("--poll-interval", type=float, default=2.0)
+
+    p = sub.add_parser("preprocess", parents=[paths], help="预处理学生提交")
+    p.set_defaults(func=cmd_preprocess)
+
+    p = sub.add_parser("grade", parents=[paths, llm], help="批改")
+    p.add_argument("--preprocess", action="store_true", help="边预处理边批改")
+    p.set_defaults(func=cmd_grade)
+
+    p = sub.add_parser("summarize", parents=[paths], help="汇总成绩")
+    p.add_argument("--total-questions", type=int, default=None, help="题目总数，默认按题目目录统计")
+    p.add_argument("--output", default=None, help="CSV 路径，默认 <processed-dir>/grade_summary.csv")
+    p.set_defaults(func=cmd_summarize)
+
+    p = sub.add_parser("status", parents=[paths], help="查询课程整体批改状态（基于 processed 目录索引）")
+    p.add_argument("--no-refresh", action="store_true", help="仅查询索引，不扫描目录")
+    p.add_argument("--deep", action="store_true",
+                   help="刷新时同时检查各题目文件夹与 grade.log 的 mtime（发现手动修改的 answer.md 或 grade.log）")
+    p.set_defaults(func=cmd_status)
+
+    p = sub.add_parser("coordinator", parents=[paths, queue], help="分布式批改：发布任务并汇总结果")
+    p.set_defaults(func=cmd_coordinator)
+
+    p = sub.add_parser("worker", parents=[paths, llm, queue], help="分布式批改：领取任务并批改")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--worker-id", default=None)
+    p.set_defaults(func=cmd_worker)
+
+    p = sub.add_parser("bench", parents=[paths, llm], help="测量各子命令的启动耗时 / 对比答案压缩效果")
+    p.add_argument("commands", nargs="*", choices=list(COMMAND_IMPORTS))
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--compaction", type=int, default=0, metavar="N",
+                   help="抽取 N 份答案，分别以原文与压缩文本批改并对比分数与 tokens")
+    p.set_defaults(func=cmd_bench)
 
-from aiolimiter import AsyncLimiter
+    return parser
 
-from util.process_raw import process_raw
-from llm.Agent import Agent
-from util.grade_sequence import grade_sequence
-from util.postprocess_grade import collect_student_results, export_summary
 
-#QWEN official model: Agent(model_name='qwen-flash', base_url='https://dashscope.aliyuncs.com/compatible-mode/v1', rate_limit=rate_limit)
-# POE Agent(model_name='Qwen3-235B-2507-FW', base_url='https://api.poe.com/v1', rate_limit=rate_limit)
+def main(argv=None) -> None:
+    args = build_parser().parse_args(argv)
+    args.func(args)
 
-process_raw()
-# rate_limit = AsyncLimiter(500, 60) #POE API Requests are rate-limited to 500 requests per minute per user
 
-# grader = Agent(model_name='qwen-flash', base_url='https://dashscope.aliyuncs.com/compatible-mode/v1', rate_limit=rate_limit)
-# asyncio.run(grade_sequence(grader=grader))
-# results = collect_student_results(processed_dir="./data/processed", total_questions=7)
-# export_summary(results, output_path="./data/processed/grade_summary.csv")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
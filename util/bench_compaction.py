@@ -0,0 +1,62 @@
+import os
+import random
+import asyncio
+from typing import Dict, List, Tuple, TYPE_CHECKING
+
+from llm.compact_answer import summarize_compaction
+
+if TYPE_CHECKING:
+    from llm.Agent import Agent
+
+async def bench_compaction(grader: "Agent", processed_dir: str = "./data/processed",
+                           sample: int = 20, seed: int = 0) -> Dict[str, float]:
+    """
+    对比压缩前后的批改结果：随机抽取 sample 份 answer.md，分别以原文与压缩后的文本批改，
+    统计分数一致率、平均分差与实际 tokens 消耗。该对比不会写入 grade.log。
+
+    Args:
+        grader: 用以批改的Agent
+        processed_dir: 处理后文件目录
+        sample: 抽取的答案份数
+        seed: 随机种子
+
+    Returns:
+        汇总指标
+    """
+    answers: List[Tuple[str, str]] = []
+    for student in sorted(os.listdir(processed_dir)):
+        student_path = os.path.join(processed_dir, student)
+        if not os.path.isdir(student_path):
+            continue
+        for qid in sorted(os.listdir(student_path)):
+            answer_path = os.path.join(student_path, qid, "answer.md")
+            if qid.isdigit() and os.path.isfile(answer_path):
+                answers.append((answer_path, qid))
+
+    answers = random.Random(seed).sample(answers, min(sample, len(answers)))
+    if not answers:
+        print("⚠️ 未找到可用于对比的 answer.md")
+        return {}
+
+    records_before = len(grader.compaction_records)
+    full, compacted = await asyncio.gather(
+        asyncio.gather(*(grader.ainvoke(path, int(qid), compact=False) for path, qid in answers)),
+        asyncio.gather(*(grader.ainvoke(path, int(qid), compact=True) for path, qid in answers)),
+    )
+
+    pairs = [(a[1], b[1]) for a, b in zip(full, compacted) if a[1] is not None and b[1] is not None]
+    agree = sum(1 for a, b in pairs if a == b)
+    metrics = {
+        "answers": len(answers),
+        "compared": len(pairs),
+        "agreement": agree / len(pairs) if pairs else 0.0,
+        "mean_abs_diff": sum(abs(a - b) for a, b in pairs) / len(pairs) if pairs else 0.0,
+        "tokens_full": sum(r[3] or 0 for r in full),
+        "tokens_compacted": sum(r[3] or 0 for r in compacted),
+    }
+
+    print(f"\n⚖️ 答案压缩对比（{metrics['answers']} 份，{metrics['compared']} 份两次均成功批改）")
+    print(f"分数一致率: {metrics['agreement']:.1%}，平均分差: {metrics['mean_abs_diff']:.2f}")
+    print(f"实际 tokens: 原文 {metrics['tokens_full']} → 压缩 {metrics['tokens_compacted']}")
+    print(summarize_compaction(grader.compaction_records[records_before:]))
+    return metrics
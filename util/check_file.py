@@ -1,10 +1,34 @@
 import os
-from typing import Union
+from typing import Optional, Union, Iterable, TYPE_CHECKING
 
-def check_process_correctness(student_name: str) -> bool:
-    raw_dir = os.path.join("./data/raw", student_name)
-    processed_dir = os.path.join("./data/processed", student_name)
-    tasks_dir = "./data/tasks"
+if TYPE_CHECKING:
+    from .processed_index import ProcessedIndex
+
+PROCESSED_MARKER = ".processed"
+# processed 目录下的一次性迁移完成标记（见 migrate_processed_markers）
+MIGRATION_MARKER = ".markers_migrated"
+
+def check_process_correctness(student_name: str,
+                              raw_dir: str = "./data/raw",
+                              processed_dir: str = "./data/processed",
+                              tasks_dir: str = "./data/tasks",
+                              index: Optional["ProcessedIndex"] = None) -> bool:
+    """
+    检查单个学生的处理结果；提供 index 时 processed 一侧的题目文件夹与 answer.md 从索引读取，
+    只访问 raw 目录与 tasks 目录
+    """
+    raw_dir = os.path.join(raw_dir, student_name)
+    processed_dir = os.path.join(processed_dir, student_name)
+
+    if index is not None:
+        if not index.has_student(student_name):
+            return False
+        question_dirs = [d for d in index.question_dirs(student_name) if d.isdigit()]
+        return all([
+            is_only_one_mlx(raw_dir=raw_dir),
+            _count_ids({int(d) for d in question_dirs}) == count_task_number(tasks_dir),
+            set(question_dirs) <= set(index.questions(student_name)),
+        ])
 
     if not os.path.isdir(processed_dir):
         return False
@@ -15,6 +39,74 @@ def check_process_correctness(student_name: str) -> bool:
         do_all_contain_answer_file(processed_dir=processed_dir)
     ])
 
+def check_split_result(mlx_count: int, question_nums: Iterable[int], task_number: int) -> bool:
+    """
+    预处理流水线的 validate 阶段：基于流水线中已知的转换/切分结果检查正确性，无需重新读取目录。
+
+    Args:
+        mlx_count: 学生原始目录下的 .mlx 文件数量
+        question_nums: 已成功写出 answer.md 的题号
+        task_number: 题目总数（count_task_number(tasks_dir)）
+    """
+    return mlx_count == 1 and _count_ids(set(question_nums)) == task_number
+
+def is_marked_processed(processed_dir: Union[str, os.PathLike]) -> bool:
+    return os.path.isfile(os.path.join(processed_dir, PROCESSED_MARKER))
+
+def mark_processed(processed_dir: Union[str, os.PathLike]) -> None:
+    """在 validate 通过后写入标记文件，供断点启动时跳过该学生"""
+    with open(os.path.join(processed_dir, PROCESSED_MARKER), "w", encoding="utf-8"):
+        pass
+
+def clear_processed_mark(processed_dir: Union[str, os.PathLike]) -> None:
+    """删除标记文件（重新处理后不再合规时调用）"""
+    try:
+        os.remove(os.path.join(processed_dir, PROCESSED_MARKER))
+    except FileNotFoundError:
+        pass
+
+def migrate_processed_markers(raw_dir: str = "./data/raw",
+                              processed_dir: str = "./data/processed",
+                              tasks_dir: str = "./data/tasks",
+                              index: Optional["ProcessedIndex"] = None) -> int:
+    """
+    一次性迁移：引入 .processed 标记之前处理的学生没有标记文件，按 check_process_correctness
+    检查其目录，通过则补写标记，避免重新转换。完成后在 processed_dir 写入 MIGRATION_MARKER，
+    之后的运行不再检查（未通过预处理校验的学生由流水线重新处理）。
+    提供 index 时先刷新索引，学生列表、标记与题目均从索引读取，补写标记后同步刷新该学生。
+
+    Returns:
+        补写标记的学生数
+    """
+    sentinel = os.path.join(processed_dir, MIGRATION_MARKER)
+    if not os.path.isdir(processed_dir) or os.path.isfile(sentinel):
+        return 0
+
+    if index is not None:
+        index.refresh()
+        unmarked = [s for s in index.students() if not index.is_marked(s)]
+    else:
+        unmarked = [s for s in sorted(os.listdir(processed_dir))
+                    if not s.startswith(".") and os.path.isdir(os.path.join(processed_dir, s))
+                    and not is_marked_processed(os.path.join(processed_dir, s))]
+
+    migrated = 0
+    for student in unmarked:
+        if not os.path.isdir(os.path.join(raw_dir, student)):
+            continue
+        if check_process_correctness(student, raw_dir=raw_dir, processed_dir=processed_dir,
+                                     tasks_dir=tasks_dir, index=index):
+            mark_processed(os.path.join(processed_dir, student))
+            if index is not None:
+                index.refresh_student(student)
+            migrated += 1
+
+    with open(sentinel, "w", encoding="utf-8"):
+        pass
+    if migrated:
+        print(f"🔖 已为 {migrated} 位学生的旧处理结果补写 {PROCESSED_MARKER} 标记")
+    return migrated
+
 def is_only_one_mlx(raw_dir:  Union[str, os.PathLike]) -> bool:
     mlx_files = [file for file in os.listdir(raw_dir) if file.endswith('mlx')]
     return len(mlx_files) == 1
@@ -27,8 +119,11 @@ def is_task_number_right(processed_dir:  Union[str, os.PathLike], tasks_dir:  Un
 
 def count_task_number(path) -> int:
     dirs = {int(d) for d in os.listdir(path) if os.path.isdir(os.path.join(path, d)) and d.isdigit()}
-    if not dirs: return 0
-    return min(len(dirs),max(dirs))
+    return _count_ids(dirs)
+
+def _count_ids(ids: set) -> int:
+    if not ids: return 0
+    return min(len(ids),max(ids))
 
 def do_all_contain_answer_file(processed_dir:  Union[str, os.PathLike]) -> bool:
     return all(
@@ -0,0 +1,156 @@
+import os
+import time
+import socket
+import asyncio
+from typing import Optional, TYPE_CHECKING
+
+from tqdm import tqdm
+
+from llm.voting import summarize_votes
+from llm.compact_answer import summarize_compaction
+from .grade_queue import GradeQueue, GradeJob
+from .grade_sequence import GradeSession
+
+if TYPE_CHECKING:
+    from llm.Agent import Agent
+    from .processed_index import ProcessedIndex
+
+def run_coordinator(queue: GradeQueue, processed_dir: str = "./data/processed",
+                    overlap_mode: bool = False, tasks_dir: str = "./data/tasks",
+                    poll_interval: float = 2.0, index: Optional["ProcessedIndex"] = None) -> None:
+    """
+    分布式批改的协调者：发布所有需要批改的 (student, qid) 任务，
+    持续汇总 worker 提交的结果写入 grade.log，全部完成后生成 grade.txt 与警告日志
+
+    Args:
+        queue: 共享批改队列
+        processed_dir: 处理后文件输出目录
+        overlap_mode: 如果为 True，无论 log 中是否已有结果，全部重新批改
+        tasks_dir: 题目目录
+        poll_interval: 轮询队列的间隔（秒）
+        index: processed 目录索引；提供时通过索引获取学生、题目与 grade.log
+    """
+    session = GradeSession(grader=None, processed_dir=processed_dir,
+                           overlap_mode=overlap_mode, tasks_dir=tasks_dir, index=index)
+    if index is not None:
+        index.refresh()
+        students = index.students()
+    else:
+        students = sorted(os.listdir(processed_dir))
+
+    jobs = []
+    for student in students:
+        for s, q, answer_path in session.add_student(student):
+            jobs.append((s, q, os.path.relpath(answer_path, processed_dir)))
+
+    published = queue.publish(jobs)
+    print(f"📤 已发布 {published} 个批改任务（共需批改 {len(jobs)} 题）")
+
+    with tqdm(total=len(jobs), desc="批改进度", unit="题") as pbar:
+        while True:
+            for student, qid, score, reason, tokens in queue.collect():
+                if student not in session.log_paths:
+                    session.add_student(student)
+                if student not in session.log_paths:
+                    continue
+                session.record(student, qid, score, reason, tokens=tokens)
+                pbar.update(1)
+
+            counts = queue.counts()
+            if not any(counts.get(status, 0) for status in ("pending", "leased", "done")):
+                break
+            time.sleep(poll_interval)
+
+    session.finalize()
+
+
+async def run_worker(grader: "Agent", queue: GradeQueue, processed_dir: str = "./data/processed",
+                     worker_id: Optional[str] = None, concurrency: int = 8,
+                     poll_interval: float = 2.0, exit_when_idle: bool = True) -> int:
+    """
+    分布式批改的 worker：从共享队列租用任务，调用 Agent 批改并 ack 结果
+
+    Args:
+        grader: 用以批改的Agent（每个 worker 可使用不同的 API Key 与限流）
+        queue: 共享批改队列
+        processed_dir: 处理后文件目录（各机器上指向同一份共享数据）
+        worker_id: worker 标识，默认 主机名-进程号
+        concurrency: 同时进行中的批改任务数
+        poll_interval: 队列为空时的轮询间隔（秒）
+        exit_when_idle: 如果为 True，队列中没有待批改或批改中的任务时退出；
+            队列为空（协调者尚未发布任务）时一直等待
+
+    Returns:
+        被队列接受的结果数
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    in_flight = set()
+    accepted = 0
+
+    async def keep_leased(job: GradeJob) -> None:
+        # 单次批改（含重试与投票）可能超过租约时间，批改期间每 1/3 租约时间续约一次
+        while True:
+            await asyncio.sleep(max(queue.lease_timeout / 3, 1.0))
+            try:
+                if not await asyncio.to_thread(queue.renew, job, worker_id):
+                    print(f"⚠️ [{worker_id}] {job.student} Q{job.qid} 租约已被收回")
+                    return
+            except Exception as e:
+                print(f"⚠️ [{worker_id}] {job.student} Q{job.qid} 续约失败: {e}")
+
+    async def grade(job: GradeJob) -> None:
+        nonlocal accepted
+        answer_path = os.path.join(processed_dir, job.answer_path)
+        heartbeat = asyncio.create_task(keep_leased(job))
+        try:
+            is_correct, score, reason, tokens = await grader.ainvoke(answer_path, int(job.qid))
+        except Exception as e:
+            is_correct, score, reason, tokens = False, None, f"批改失败: {e}", 0
+        finally:
+            heartbeat.cancel()
+
+        try:
+            acked = await asyncio.to_thread(queue.ack, job, worker_id, score, reason, tokens)
+        except Exception as e:
+            # 提交失败时不退出，租约超时后该任务会被重新领取
+            print(f"❌ [{worker_id}] {job.student} Q{job.qid} 提交结果失败: {e}")
+            return
+        if acked:
+            accepted += 1
+        else:
+            print(f"⚠️ [{worker_id}] {job.student} Q{job.qid} 租约已失效，结果被丢弃")
+
+    print(f"🚀 worker {worker_id} 已启动，并发数 {concurrency}")
+    seen_work = waiting = False
+    while True:
+        free = concurrency - len(in_flight)
+        jobs = await asyncio.to_thread(queue.lease, worker_id, free) if free > 0 else []
+        seen_work = seen_work or bool(jobs)
+        for job in jobs:
+            task = asyncio.create_task(grade(job))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        if in_flight:
+            await asyncio.wait(in_flight, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+            continue
+
+        if exit_when_idle:
+            counts = await asyncio.to_thread(queue.counts)
+            busy = counts.get("pending", 0) or counts.get("leased", 0)
+            # 队列中已有任务但均已完成（例如在队列清空后才启动）时同样退出
+            if not busy and (seen_work or counts):
+                break
+            if not busy and not waiting:
+                print(f"⏳ [{worker_id}] 队列中暂无任务，等待协调者发布...")
+                waiting = True
+            seen_work = seen_work or bool(busy)
+        await asyncio.sleep(poll_interval)
+
+    print(f"✅ worker {worker_id} 已退出，共提交 {accepted} 个结果")
+    if getattr(grader, "compaction_records", None):
+        print(summarize_compaction(grader.compaction_records))
+    if getattr(grader, "vote_records", None):
+        print(summarize_votes(grader.vote_records))
+    return accepted
+
@@ -0,0 +1,144 @@
+"""
+在单机上端到端检查分布式批改：模拟服务 + 协调者 + 一个领取任务后"崩溃"的 worker + 两个正常 worker
+
+    python -m util.distributed_selftest
+
+检查：所有题目均得到满分，"崩溃" worker 持有的任务在租约超时后被重新领取并完成，
+其余任务只被领取一次（--delay 大于 --lease-timeout 时即检查批改期间的续约）。
+协调者与 worker 以子进程方式运行 main.py，因此需要已安装批改所需的依赖（不需要 MATLAB）。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from typing import List
+
+from .check_file import mark_processed
+from .grade_queue import GradeQueue
+from .mock_llm import start_mock_llm
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+FULL_SCORE = 10
+
+
+def run_selftest(students: int = 6, questions: int = 2, dead_jobs: int = 3,
+                 lease_timeout: float = 3.0, delay: float = 0.2, timeout: float = 120.0) -> bool:
+    """
+    Args:
+        students / questions: 模拟课程的学生数与题目数
+        dead_jobs: "崩溃" worker 领取后不再 ack 的任务数
+        lease_timeout: 租约超时（秒）
+        delay: 模拟服务每个请求的延迟（秒）
+        timeout: 等待协调者结束的最长时间（秒）
+
+    Returns:
+        是否通过
+    """
+    with tempfile.TemporaryDirectory() as root:
+        tasks_dir, processed_dir = os.path.join(root, "tasks"), os.path.join(root, "processed")
+        db = os.path.join(root, "grade_queue.sqlite")
+        _build_course(tasks_dir, processed_dir, students, questions)
+
+        server, base_url = start_mock_llm(delay=delay)
+        common = ["--processed-dir", processed_dir, "--tasks-dir", tasks_dir, "--no-index",
+                  "--db", db, "--lease-timeout", str(lease_timeout), "--poll-interval", "0.5"]
+        env = {**os.environ, "MOCK_LLM_API_KEY": "mock"}
+        procs: List[subprocess.Popen] = []
+        try:
+            coordinator = subprocess.Popen([sys.executable, MAIN, "coordinator", *common], env=env)
+            procs.append(coordinator)
+
+            # "崩溃"的 worker：领取任务后既不 ack 也不续约
+            queue = GradeQueue(db, lease_timeout=lease_timeout)
+            dead = []
+            deadline = time.time() + timeout
+            while not dead and time.time() < deadline:
+                dead = queue.lease("dead-worker", dead_jobs)
+                time.sleep(0.05)
+            print(f"💀 dead-worker 领取了 {len(dead)} 个任务后退出")
+
+            for worker_id in ("worker-a", "worker-b"):
+                procs.append(subprocess.Popen(
+                    [sys.executable, MAIN, "worker", *common, "--worker-id", worker_id,
+                     "--base-url", base_url, "--model", "mock", "--api-key-env", "MOCK_LLM_API_KEY",
+                     "--concurrency", "2"],
+                    env=env,
+                ))
+            for proc in procs:
+                proc.wait(timeout=max(deadline - time.time(), 1))
+        finally:
+            for proc in procs:
+                if proc.poll() is None:
+                    proc.kill()
+            server.shutdown()
+
+        return _check(processed_dir, students, questions, queue, dead,
+                      [proc.returncode for proc in procs])
+
+
+def _build_course(tasks_dir: str, processed_dir: str, students: int, questions: int) -> None:
+    for qid in range(1, questions + 1):
+        q_dir = os.path.join(tasks_dir, str(qid))
+        os.makedirs(q_dir)
+        for name, content in (("task_content", f"第{qid}题"), ("solution", "y = x * 2;"),
+                              ("score", f"{FULL_SCORE}")):
+            with open(os.path.join(q_dir, name), "w", encoding="utf-8") as f:
+                f.write(content)
+
+    for n in range(students):
+        student_dir = os.path.join(processed_dir, f"student{n:02d}")
+        for qid in range(1, questions + 1):
+            os.makedirs(os.path.join(student_dir, str(qid)))
+            with open(os.path.join(student_dir, str(qid), "answer.md"), "w", encoding="utf-8") as f:
+                f.write("```matlab\ny = x * 2;\n```")
+        mark_processed(student_dir)
+
+
+def _check(processed_dir: str, students: int, questions: int, queue: GradeQueue,
+           dead: list, returncodes: List[int]) -> bool:
+    problems = []
+    if any(code != 0 for code in returncodes):
+        problems.append(f"子进程退出码: {returncodes}")
+    if not dead:
+        problems.append("dead-worker 未领取到任务，无法检查租约回收")
+
+    for n in range(students):
+        log_path = os.path.join(processed_dir, f"student{n:02d}", "grade.log")
+        try:
+            with open(log_path, "r", encoding="utf-8") as f:
+                grade_log = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            problems.append(f"{log_path}: {e}")
+            continue
+        wrong = {qid: score for qid, (score, _) in grade_log.items() if score != FULL_SCORE}
+        if len(grade_log) != questions or wrong:
+            problems.append(f"student{n:02d} 批改结果不正确: {grade_log}")
+
+    attempts = queue.attempts()
+    dead_keys = {(job.student, job.qid) for job in dead}
+    for key, count in attempts.items():
+        if key in dead_keys and count < 2:
+            problems.append(f"{key[0]} Q{key[1]} 的过期租约未被重新领取")
+        elif key not in dead_keys and count != 1:
+            problems.append(f"{key[0]} Q{key[1]} 被领取了 {count} 次（批改中的租约未续约）")
+
+    if problems:
+        print("❌ 分布式批改自检失败:\n" + "\n".join(f"- {p}" for p in problems))
+        return False
+    print(f"✅ 分布式批改自检通过：{students * questions} 题全部批改，"
+          f"{len(dead)} 个过期租约均被重新领取，其余任务均只领取一次")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="单机分布式批改自检")
+    parser.add_argument("--students", type=int, default=6)
+    parser.add_argument("--questions", type=int, default=2)
+    parser.add_argument("--lease-timeout", type=float, default=3.0)
+    parser.add_argument("--delay", type=float, default=0.2, help="模拟服务每个请求的延迟（秒）")
+    args = parser.parse_args()
+    sys.exit(0 if run_selftest(args.students, args.questions, lease_timeout=args.lease_timeout,
+                               delay=args.delay) else 1)
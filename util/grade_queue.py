@@ -0,0 +1,211 @@
+import os
+import time
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+_SCHEMA = [
+    """
+CREATE TABLE IF NOT EXISTS jobs (
+    student     TEXT NOT NULL,
+    qid         TEXT NOT NULL,
+    answer_path TEXT NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    worker      TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    score       INTEGER,
+    reason      TEXT,
+    tokens      INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (student, qid)
+)
+""",
+    "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)",
+]
+
+T = TypeVar("T")
+
+
+@dataclass
+class GradeJob:
+    """一道题的批改任务；answer_path 为相对 processed_dir 的路径"""
+    student: str
+    qid: str
+    answer_path: str
+    attempts: int = 0
+
+
+class GradeQueue:
+    """
+    基于 SQLite 文件的共享批改队列，用于多进程 / 多机器分布式批改
+
+    任务状态: pending → leased → done → collected
+    - worker 通过 lease 领取任务，批改期间定期 renew 续约，完成后 ack 结果
+    - 超时未 ack 的任务（worker 崩溃或断线）会在下次 lease 时重新回到 pending
+    - 超过 max_attempts 次租约仍未完成的任务直接标记为 done（score 为空），避免反复拖垮 worker
+
+    注意：多台机器共享时，SQLite 文件需放在支持文件锁的共享存储上。
+    数据库被锁定（database is locked）时，每个操作会退避重试 lock_retries 次。
+
+    Args:
+        db_path: SQLite 文件路径
+        lease_timeout: 单次租约的有效时间（秒）
+        max_attempts: 每个任务最多被租用的次数
+        lock_retries: 数据库被锁定时的重试次数
+    """
+
+    def __init__(self, db_path: str, lease_timeout: float = 300.0, max_attempts: int = 3,
+                 lock_retries: int = 5):
+        self.db_path = db_path
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.lock_retries = lock_retries
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        def create(conn: sqlite3.Connection) -> None:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+
+        self._run(create)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # 每次操作使用独立连接，便于在线程池与多进程中共享
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            # BEGIN 本身失败时没有可回滚的事务，直接抛出原始错误
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _run(self, operation: Callable[[sqlite3.Connection], T]) -> T:
+        """在一个事务中执行 operation；数据库被锁定时按指数退避重试"""
+        for attempt in range(self.lock_retries + 1):
+            try:
+                with self._connect() as conn:
+                    return operation(conn)
+            except sqlite3.OperationalError as e:
+                message = str(e).lower()
+                if attempt == self.lock_retries or ("locked" not in message and "busy" not in message):
+                    raise
+                delay = min(0.5 * 2 ** attempt, 10.0)
+                print(f"⚠️ 队列数据库被锁定，{delay:.1f}s 后重试（{attempt + 1}/{self.lock_retries}）: {e}")
+                time.sleep(delay)
+
+    def publish(self, jobs: Iterable[Tuple[str, str, str]]) -> int:
+        """
+        发布 (student, qid, answer_path) 任务。
+        已汇总（collected）的同名任务会被重置为 pending；正在排队或批改中的任务保持不变。
+
+        Returns:
+            新发布（或被重置）的任务数
+        """
+        jobs = list(jobs)
+
+        def publish(conn: sqlite3.Connection) -> int:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT INTO jobs (student, qid, answer_path) VALUES (?, ?, ?) "
+                "ON CONFLICT (student, qid) DO UPDATE SET "
+                "status = 'pending', answer_path = excluded.answer_path, worker = NULL, "
+                "lease_until = NULL, attempts = 0, score = NULL, reason = NULL, tokens = 0 "
+                "WHERE jobs.status = 'collected'",
+                jobs,
+            )
+            return conn.total_changes - before
+
+        return self._run(publish)
+
+    def lease(self, worker: str, n: int = 1) -> List[GradeJob]:
+        """
+        为 worker 领取最多 n 个任务，同时回收已过期的租约
+        """
+        def lease(conn: sqlite3.Connection) -> List[GradeJob]:
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'done', worker = NULL, lease_until = NULL, "
+                "reason = '多次租约超时，未能完成批改' "
+                "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'pending', worker = NULL, lease_until = NULL "
+                "WHERE status = 'leased' AND lease_until < ?",
+                (now,),
+            )
+            rows = conn.execute(
+                "SELECT student, qid, answer_path, attempts FROM jobs "
+                "WHERE status = 'pending' ORDER BY student, CAST(qid AS INTEGER) LIMIT ?",
+                (n,),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                "WHERE student = ? AND qid = ?",
+                [(worker, now + self.lease_timeout, student, qid) for student, qid, _, _ in rows],
+            )
+            return [GradeJob(student, qid, path, attempts + 1) for student, qid, path, attempts in rows]
+
+        return self._run(lease)
+
+    def ack(self, job: GradeJob, worker: str, score: Optional[int], reason: Optional[str], tokens: int) -> bool:
+        """
+        提交批改结果；若租约已过期并被其他 worker 领取，则丢弃该结果
+
+        Returns:
+            结果是否被接受
+        """
+        def ack(conn: sqlite3.Connection) -> bool:
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'done', score = ?, reason = ?, tokens = ?, lease_until = NULL "
+                "WHERE student = ? AND qid = ? AND status = 'leased' AND worker = ?",
+                (score, reason, tokens, job.student, job.qid, worker),
+            )
+            return cur.rowcount == 1
+
+        return self._run(ack)
+
+    def renew(self, job: GradeJob, worker: str) -> bool:
+        """
+        续约：将 worker 仍在批改的任务的租约延长 lease_timeout 秒
+
+        Returns:
+            租约是否仍属于该 worker
+        """
+        def renew(conn: sqlite3.Connection) -> bool:
+            cur = conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE student = ? AND qid = ? AND status = 'leased' AND worker = ?",
+                (time.time() + self.lease_timeout, job.student, job.qid, worker),
+            )
+            return cur.rowcount == 1
+
+        return self._run(renew)
+
+    def collect(self) -> List[Tuple[str, str, Optional[int], Optional[str], int]]:
+        """
+        取出所有已完成但尚未汇总的结果 (student, qid, score, reason, tokens)，并标记为 collected
+        """
+        def collect(conn: sqlite3.Connection) -> List[Tuple[str, str, Optional[int], Optional[str], int]]:
+            rows = conn.execute(
+                "SELECT student, qid, score, reason, tokens FROM jobs WHERE status = 'done'"
+            ).fetchall()
+            conn.execute("UPDATE jobs SET status = 'collected' WHERE status = 'done'")
+            return rows
+
+        return self._run(collect)
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的任务数量"""
+        return self._run(lambda conn: dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")))
+
+    def attempts(self) -> Dict[Tuple[str, str], int]:
+        """各任务被租用的次数，用于检查超时租约是否被重新领取"""
+        return self._run(lambda conn: {(student, qid): attempts for student, qid, attempts
+                                       in conn.execute("SELECT student, qid, attempts FROM jobs")})
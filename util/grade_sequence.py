@@ -1,15 +1,21 @@
 import os
 import json
-from typing import Union, Dict, Tuple
+from typing import Union, Dict, List, Optional, Tuple, TYPE_CHECKING
 import asyncio
 from tqdm import tqdm
 from datetime import datetime
 
-from llm import Agent
+from llm.voting import summarize_votes
+from llm.compact_answer import summarize_compaction, export_compaction_report
 from .check_file import count_task_number
 
-async def grade_sequence(grader: Agent, processed_dir: str = "./data/processed",
-                         overlap_mode: bool = False) -> None:
+if TYPE_CHECKING:
+    from llm.Agent import Agent
+    from .processed_index import ProcessedIndex
+
+async def grade_sequence(grader: "Agent", processed_dir: str = "./data/processed",
+                         overlap_mode: bool = False, tasks_dir: str = "./data/tasks",
+                         index: Optional["ProcessedIndex"] = None) -> None:
     """
     依次为每个学生的每道题打分，并最终计算每个学生的总得分和最终comments
 
@@ -17,94 +23,199 @@ async def grade_sequence(grader: Agent, processed_dir: str = "./data/processed",
         grader: 用以批改的Agent
         processed_dir: 处理后文件输出目录
         overlap_mode: 如果为 True，无论 log 中是否已有结果，全部重新批改
+        tasks_dir: 题目目录
+        index: processed 目录索引；提供时通过增量刷新后的索引获取学生、题目与 grade.log，不再遍历目录
     """
+    session = GradeSession(grader, processed_dir=processed_dir, overlap_mode=overlap_mode,
+                           tasks_dir=tasks_dir, index=index)
     all_tasks = []
-    log_paths = {}
-    q_num: int = count_task_number(os.path.join("./data/tasks"))
+    if index is not None:
+        index.refresh()
+        students = index.students()
+    else:
+        students = os.listdir(processed_dir)
+    for student in students:
+        all_tasks.extend(session.add_student(student))
+
+    tasks = [session.grade_one(s, q, a) for s, q, a in all_tasks]
+    with tqdm(total=len(all_tasks), desc="批改进度", unit="题") as pbar:
+        for coro in asyncio.as_completed(tasks):
+            await coro
+            pbar.update(1)
+
+    session.finalize()
+
+
+async def grade_stream(grader: "Agent", students: asyncio.Queue, processed_dir: str = "./data/processed",
+                       overlap_mode: bool = False, tasks_dir: str = "./data/tasks",
+                       index: Optional["ProcessedIndex"] = None) -> None:
+    """
+    从队列中持续读取已完成预处理的学生并立即批改，队列中取到 None 时结束
+
+    Args:
+        grader: 用以批改的Agent
+        students: 学生文件夹名队列（processed_dir 下的子目录名），以 None 结尾
+        processed_dir: 处理后文件输出目录
+        overlap_mode: 如果为 True，无论 log 中是否已有结果，全部重新批改
+        tasks_dir: 题目目录
+        index: processed 目录索引；入队的学生已由预处理（validate 后的 refresh_student）或入队前的刷新写入索引
+    """
+    session = GradeSession(grader, processed_dir=processed_dir, overlap_mode=overlap_mode,
+                           tasks_dir=tasks_dir, index=index)
+    pending = set()
+
+    with tqdm(total=0, desc="批改进度", unit="题") as pbar:
+        while (student := await students.get()) is not None:
+            new_tasks = session.add_student(student)
+            pbar.total += len(new_tasks)
+            pbar.refresh()
+            for s, q, a in new_tasks:
+                task = asyncio.create_task(session.grade_one(s, q, a))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                task.add_done_callback(lambda _: pbar.update(1))
+
+        if pending:
+            await asyncio.gather(*pending)
+
+    session.finalize()
 
-    for student in os.listdir(processed_dir):
-        student_path = os.path.join(processed_dir, student)
-        if not os.path.isdir(student_path):
-            continue
 
+class GradeSession:
+    """
+    一次批改过程中的共享状态：各学生的 grade.log、累计得分与 tokens 消耗
+
+    提供 index 时，学生的题目与 grade.log 从索引读取，写入 grade.log 时同步更新索引。
+    """
+    def __init__(self, grader: "Agent", processed_dir: str = "./data/processed",
+                 overlap_mode: bool = False, tasks_dir: str = "./data/tasks",
+                 index: Optional["ProcessedIndex"] = None):
+        self.grader = grader
+        self.index = index
+        self.processed_dir = processed_dir
+        self.overlap_mode = overlap_mode
+        self.q_num: int = count_task_number(tasks_dir)
+        self.log_paths: Dict[str, Tuple[str, Dict]] = {}
+        self.student_results: Dict[str, Dict] = {}
+        self.total_tokens = 0
+
+    def add_student(self, student: str) -> List[Tuple[str, str, str]]:
+        """
+        加载（或初始化）学生的 grade.log，返回需要批改的 (student, qid, answer_path) 列表
+        """
+        student_path = os.path.join(self.processed_dir, student)
         log_path = os.path.join(student_path, "grade.log")
-        if not os.path.exists(log_path):
-            grade_log = init_grade_log(student_path, q_num=q_num)
+
+        if self.index is not None:
+            if not self.index.has_student(student):
+                return []
+            log_exists, grade_log = self.index.grade_log(student)
+            answered = set(self.index.questions(student))
         else:
-            try:
-                with open(log_path, "r", encoding="utf-8") as f:
-                    grade_log = json.load(f)
-            except json.JSONDecodeError:
+            if not os.path.isdir(student_path):
+                return []
+            log_exists, grade_log = os.path.exists(log_path), None
+            if log_exists:
+                try:
+                    with open(log_path, "r", encoding="utf-8") as f:
+                        grade_log = json.load(f)
+                except json.JSONDecodeError:
+                    pass
+            answered = None
+
+        if grade_log is None:
+            if log_exists:
                 print(f"⚠️ {student}/grade.log 格式损坏，重新初始化")
-                grade_log = init_grade_log(student_path, q_num=q_num)
+            grade_log = init_grade_log(student_path, q_num=self.q_num)
+            if self.index is not None:
+                self.index.update_grade_log(student, grade_log)
 
-        log_paths[student] = (log_path, grade_log)
+        self.log_paths[student] = (log_path, grade_log)
 
+        tasks = []
         for qid, (score, comment) in grade_log.items():
             q_path = os.path.join(student_path, qid)
             answer_path = os.path.join(q_path, "answer.md")
-            if os.path.isdir(q_path) and os.path.exists(answer_path):
-                # 仅在需要重新批改的情况下建立任务
-                if overlap_mode or score is None:
-                    all_tasks.append((student, qid, answer_path))
-
-    async def grade_one(student, qid, answer_path):
-        nonlocal total_tokens
+            if answered is not None:
+                has_answer = qid in answered
+            else:
+                has_answer = os.path.isdir(q_path) and os.path.exists(answer_path)
+            # 仅在需要重新批改的情况下建立任务
+            if has_answer and (self.overlap_mode or score is None):
+                tasks.append((student, qid, answer_path))
+
+        if tasks:
+            self.student_results.setdefault(student, {"total": 0, "comments": []})
+        return tasks
+
+    async def grade_one(self, student: str, qid: str, answer_path: str):
         try:
-            is_correct, score, reason, tokens = await grader.ainvoke(answer_path, int(qid))
-            total_tokens += tokens
+            is_correct, score, reason, tokens = await self.grader.ainvoke(answer_path, int(qid))
         except Exception as e:
             is_correct, score, reason, tokens = False, None, f"批改失败: {e}", 0
 
-        log_path, grade_log = log_paths[student]
-        grade_log[qid] = [score, reason]
-        with open(log_path, "w", encoding="utf-8") as f:
-            json.dump(grade_log, f, ensure_ascii=False, indent=2)
+        self.record(student, qid, score, reason, tokens=tokens)
         return student, qid, score, reason
-    
-    tasks = [grade_one(s, q, a) for s, q, a in all_tasks]
-    total_tokens = 0
-    student_results = {student: {"total": 0, "comments": []} for student, _, _ in all_tasks}
 
-    with tqdm(total=len(all_tasks), desc="批改进度", unit="题") as pbar:
-        for coro in asyncio.as_completed(tasks):
-            student, qid, score, reason = await coro
-            student_results[student]["total"] += score
-            if reason:
-                student_results[student]["comments"].append(f"Q{qid}:{reason}\n")
-            pbar.update(1)
+    def record(self, student: str, qid: str, score: Union[int, None], reason: Union[str, None],
+               tokens: int) -> None:
+        """将一道题的批改结果写入 grade.log 并计入该学生的汇总"""
+        self.total_tokens += tokens
+        log_path, grade_log = self.log_paths[student]
+        grade_log[qid] = [score, reason]
+        write_grade_log(log_path, grade_log)
+        if self.index is not None:
+            self.index.update_grade_log(student, grade_log)
+
+        result = self.student_results.setdefault(student, {"total": 0, "comments": []})
+        result["total"] += score or 0
+        if reason:
+            result["comments"].append(f"Q{qid}:{reason}\n")
+
+    def finalize(self) -> None:
+        """写入 grade.txt，检查缺漏并汇总日志"""
+        processed_dir = self.processed_dir
+
+        # 写入 grade.txt
+        for student, result in self.student_results.items():
+            grade_path = os.path.join(processed_dir, student, "grade.txt")
+            sorted_comments = sorted(
+                result["comments"],
+                key=lambda c: int(c.split(":")[0][1:])  # "Q12:..." → 12
+            )
+            with open(grade_path, "w", encoding="utf-8") as f:
+                f.write(f"{result['total']}\n")
+                f.write(" ".join(sorted_comments))
+            print(f"学生 {student} 结果已保存到 {grade_path}")
+
+        # === 检查缺漏并汇总日志 ===
+        warn_log_path = os.path.join(processed_dir, "grade_warning.log")
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        missing_records = []
+
+        for student, (log_path, log_obj) in self.log_paths.items():
+            missing = [qid for qid, (score, _) in log_obj.items() if score is None]
+            if missing:
+                record = f"[{now}] 学生 {student} 未批改题目: {', '.join(missing)}\n"
+                missing_records.append(record)
+
+        if missing_records:
+            with open(warn_log_path, "a", encoding="utf-8") as f:
+                f.writelines(missing_records)
+            print(f"⚠️ 已生成警告日志 {warn_log_path}")
+        else:
+            print("✅ 所有题目均已批改完成。")
 
-    # 写入 grade.txt
-    for student, result in student_results.items():
-        grade_path = os.path.join(processed_dir, student, "grade.txt")
-        sorted_comments = sorted(
-            result["comments"],
-            key=lambda c: int(c.split(":")[0][1:])  # "Q12:..." → 12
-        )
-        with open(grade_path, "w", encoding="utf-8") as f:
-            f.write(f"{result['total']}\n")
-            f.write(" ".join(sorted_comments))
-        print(f"学生 {student} 结果已保存到 {grade_path}")
-
-    # === 检查缺漏并汇总日志 ===
-    warn_log_path = os.path.join(processed_dir, "grade_warning.log")
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    missing_records = []
-
-    for student, (log_path, log_obj) in log_paths.items():
-        missing = [qid for qid, (score, _) in log_obj.items() if score is None]
-        if missing:
-            record = f"[{now}] 学生 {student} 未批改题目: {', '.join(missing)}\n"
-            missing_records.append(record)
-
-    if missing_records:
-        with open(warn_log_path, "a", encoding="utf-8") as f:
-            f.writelines(missing_records)
-        print(f"⚠️ 已生成警告日志 {warn_log_path}")
-    else:
-        print("✅ 所有题目均已批改完成。")
+        print(f"\n🔹 总 tokens 消耗: {self.total_tokens}")
+
+        records = getattr(self.grader, "compaction_records", None)
+        if records:
+            print(summarize_compaction(records))
+            export_compaction_report(records, os.path.join(processed_dir, "compaction_report.csv"))
 
-    print(f"\n🔹 总 tokens 消耗: {total_tokens}")
+        vote_records = getattr(self.grader, "vote_records", None)
+        if vote_records:
+            print(summarize_votes(vote_records))
 
 def init_grade_log(student_path: str, q_num: int) -> Dict[str, Tuple[Union[int, None], Union[str, None]]]:
     """
@@ -118,9 +229,17 @@ def init_grade_log(student_path: str, q_num: int) -> Dict[str, Tuple[Union[int,
     """
     log_path = os.path.join(student_path, "grade.log")
     grade_log = {str(qid): [None, None] for qid in range(1, q_num + 1)}
+    write_grade_log(log_path, grade_log)
+    return grade_log
 
-    with open(log_path, "w", encoding="utf-8") as f:
-        json.dump(grade_log, f, ensure_ascii=False, indent=2)
 
-    return grade_log
+def write_grade_log(log_path: str, grade_log: Dict) -> None:
+    """
+    先写临时文件再替换 grade.log：中途中断不会留下损坏的 grade.log，
+    替换还会更新学生文件夹的 mtime，使 ProcessedIndex.refresh() 无需逐个 stat grade.log 即可发现变化。
+    """
+    tmp_path = log_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(grade_log, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, log_path)
 
@@ -1,10 +1,12 @@
 from contextlib import contextmanager
-from typing import Iterator
+from typing import Iterator, TYPE_CHECKING
 import os
 
-import matlab.engine
+# matlab.engine 导入较慢且仅在安装了 MATLAB 的机器上可用，因此在启动引擎时才导入
+if TYPE_CHECKING:
+    import matlab.engine
 
-def mlx2others(eng, mlx_input_path, html_output_path: matlab.engine.MatlabEngine):
+def mlx2others(eng: "matlab.engine.MatlabEngine", mlx_input_path, html_output_path):
     mlx_input_path = os.path.abspath(mlx_input_path)
     html_output_path = os.path.abspath(html_output_path)
     eng.matlab.internal.liveeditor.openAndConvert(mlx_input_path, html_output_path, nargout=0)
@@ -13,7 +15,7 @@ def rel_path2abs_path(rel_path: str) -> str:
     return  os.path.abspath(rel_path)
 
 @contextmanager
-def matlab_engine() -> Iterator[matlab.engine.MatlabEngine]:
+def matlab_engine() -> Iterator["matlab.engine.MatlabEngine"]:
     """
     MATLAB引擎的上下文管理器，自动处理构建引擎和关闭引擎
     
@@ -25,6 +27,8 @@ def matlab_engine() -> Iterator[matlab.engine.MatlabEngine]:
             result = eng.sqrt(4.0)
             print(result)  # 自动调用eng.quit()
     """
+    import matlab.engine
+
     eng = None
     try:
         eng = matlab.engine.start_matlab()
@@ -0,0 +1,85 @@
+"""
+最小的 OpenAI 兼容模拟服务，仅实现非流式的 POST .../chat/completions，用于在单机上测试批改流程（不消耗 API 额度）
+
+    python -m util.mock_llm --port 8000 --delay 0.5
+    python main.py worker --base-url http://127.0.0.1:8000/v1 --model mock --api-key-env MOCK_LLM_API_KEY
+
+返回 [true, 满分, ""]，满分取自 prompt 中的评分度量表。
+"""
+import re
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+_FULL_SCORE_PATTERN = re.compile(r"总分以及评分度量表是：\s*(\d+)")
+
+
+def start_mock_llm(host: str = "127.0.0.1", port: int = 0, delay: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    在后台线程中启动模拟服务
+
+    Args:
+        host: 监听地址
+        port: 监听端口，0 表示随机选择空闲端口
+        delay: 每个请求的模拟延迟（秒）
+
+    Returns:
+        (服务对象, 可直接传给 Agent 的 base_url)；结束时调用 server.shutdown()
+    """
+    server = ThreadingHTTPServer((host, port), _handler(delay))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-llm", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def _handler(delay: float):
+    class MockChatCompletions(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+            match = _FULL_SCORE_PATTERN.search(prompt)
+            content = json.dumps([True, int(match.group(1)) if match else 0, ""])
+            if delay:
+                time.sleep(delay)
+
+            payload = json.dumps({
+                "id": f"mock-{time.time_ns()}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 8,
+                          "total_tokens": len(prompt) // 4 + 8},
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+    return MockChatCompletions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的模拟批改服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--delay", type=float, default=0.0, help="每个请求的模拟延迟（秒）")
+    args = parser.parse_args()
+
+    server, base_url = start_mock_llm(args.host, args.port, args.delay)
+    print(f"🧪 模拟服务已启动: {base_url}（Ctrl+C 退出）")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
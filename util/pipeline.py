@@ -0,0 +1,195 @@
+import queue
+import threading
+import time
+from contextlib import ExitStack, nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Callable, ContextManager, Iterable, List, Optional
+
+_STOP = object()
+
+
+@dataclass
+class StageStats:
+    """单个阶段的运行统计"""
+    name: str
+    workers: int
+    processed: int = 0
+    dropped: int = 0
+    failed: int = 0
+    busy_time: float = 0.0
+    max_depth: int = 0
+    depth_sum: int = 0
+    depth_samples: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def sample_depth(self, depth: int) -> None:
+        with self.lock:
+            self.max_depth = max(self.max_depth, depth)
+            self.depth_sum += depth
+            self.depth_samples += 1
+
+    @property
+    def avg_depth(self) -> float:
+        return self.depth_sum / self.depth_samples if self.depth_samples else 0.0
+
+
+@dataclass
+class Stage:
+    """
+    流水线中的一个阶段
+
+    Args:
+        name: 阶段名称（用于统计输出）
+        func: 处理函数 func(item, ctx)，返回交给下一阶段的对象；返回 None 表示丢弃该对象
+        workers: 该阶段的工作线程数
+        context_factory: 每个工作线程独占的上下文（例如 MATLAB 引擎），其值作为 ctx 传入 func
+    """
+    name: str
+    func: Callable[[Any, Any], Any]
+    workers: int = 1
+    context_factory: Callable[[], ContextManager] = nullcontext
+
+
+class Pipeline:
+    """
+    多阶段流水线：source → stage_1 → ... → stage_n → sink
+
+    每个阶段拥有独立的线程池，阶段之间通过有界队列连接，
+    因此上游阶段处理第 N+1 个对象时，下游阶段可以同时处理第 N 个对象。
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 8,
+                 source_name: str = "discover",
+                 sink: Optional[Callable[[Any], None]] = None):
+        self.stages = stages
+        self.sink = sink
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self.source_stats = StageStats(name=source_name, workers=1)
+        self.stats = [StageStats(name=s.name, workers=s.workers) for s in stages]
+        self._alive = [s.workers for s in stages]
+        self._alive_lock = threading.Lock()
+        self.wall_time = 0.0
+
+    def run(self, source: Iterable) -> List[StageStats]:
+        """
+        运行流水线直到 source 耗尽且所有阶段处理完毕
+
+        Returns:
+            按顺序排列的各阶段统计（第一个为 source）
+        """
+        start = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._work, args=(idx,), name=f"{stage.name}-{n}", daemon=True)
+            for idx, stage in enumerate(self.stages)
+            for n in range(stage.workers)
+        ]
+        for t in threads:
+            t.start()
+
+        self._feed(source)
+        for t in threads:
+            t.join()
+
+        self.wall_time = time.perf_counter() - start
+        return [self.source_stats, *self.stats]
+
+    def _feed(self, source: Iterable) -> None:
+        stats = self.source_stats
+        try:
+            for item in source:
+                stats.processed += 1
+                self._put(0, item, stats)
+        except Exception as e:
+            stats.failed += 1
+            print(f"❌ [{stats.name}] 遍历失败: {e}")
+        finally:
+            for _ in range(self.stages[0].workers):
+                self.queues[0].put(_STOP)
+
+    def _put(self, idx: int, item: Any, producer: StageStats) -> None:
+        """将对象放入第 idx 个阶段的输入队列；idx 越界时交给 sink"""
+        if idx == len(self.stages):
+            if self.sink is not None:
+                self.sink(item)
+            return
+        q = self.queues[idx]
+        q.put(item)
+        self.stats[idx].sample_depth(q.qsize())
+
+    def _work(self, idx: int) -> None:
+        stage, stats, inq = self.stages[idx], self.stats[idx], self.queues[idx]
+
+        try:
+            with ExitStack() as stack:
+                try:
+                    ctx = stack.enter_context(stage.context_factory())
+                    ready = True
+                except Exception as e:
+                    # 上下文创建失败时仍需消费队列，避免上游阻塞
+                    print(f"❌ [{stage.name}] 工作线程初始化失败: {e}")
+                    ctx, ready = None, False
+
+                while True:
+                    item = inq.get()
+                    if item is _STOP:
+                        break
+                    if not ready:
+                        with stats.lock:
+                            stats.failed += 1
+                        continue
+                    self._handle(idx, item, ctx)
+        finally:
+            # 无论工作线程如何退出，都要通知下游，否则上游会阻塞在已满的队列上
+            with self._alive_lock:
+                self._alive[idx] -= 1
+                last = self._alive[idx] == 0
+            if last and idx + 1 < len(self.stages):
+                for _ in range(self.stages[idx + 1].workers):
+                    self.queues[idx + 1].put(_STOP)
+
+    def _handle(self, idx: int, item: Any, ctx: Any) -> None:
+        """处理单个对象并交给下一阶段（或 sink）；任一步骤失败都计入 failed"""
+        stage, stats = self.stages[idx], self.stats[idx]
+        begin = time.perf_counter()
+        try:
+            result = stage.func(item, ctx)
+        except Exception as e:
+            print(f"❌ [{stage.name}] 处理失败 {item}: {e}")
+            result, failed = None, True
+        else:
+            failed = False
+        with stats.lock:
+            stats.busy_time += time.perf_counter() - begin
+            if failed:
+                stats.failed += 1
+            elif result is None:
+                stats.dropped += 1
+            else:
+                stats.processed += 1
+
+        if result is None:
+            return
+        try:
+            self._put(idx + 1, result, stats)
+        except Exception as e:
+            print(f"❌ [{stage.name}] 交给下游失败 {result}: {e}")
+            with stats.lock:
+                stats.processed -= 1
+                stats.failed += 1
+
+def format_report(stats: List[StageStats], wall_time: float, title: str = "流水线统计") -> str:
+    """
+    生成各阶段吞吐量与队列深度的统计表
+    """
+    lines = [
+        f"\n📊 {title}（总耗时 {wall_time:.2f}s）",
+        f"{'stage':<12}{'workers':>8}{'done':>7}{'drop':>6}{'fail':>6}"
+        f"{'busy(s)':>9}{'items/s':>9}{'max_q':>7}{'avg_q':>7}",
+    ]
+    for s in stats:
+        throughput = s.processed / wall_time if wall_time > 0 else 0.0
+        lines.append(
+            f"{s.name:<12}{s.workers:>8}{s.processed:>7}{s.dropped:>6}{s.failed:>6}"
+            f"{s.busy_time:>9.2f}{throughput:>9.2f}{s.max_depth:>7}{s.avg_depth:>7.2f}"
+        )
+    return "\n".join(lines)
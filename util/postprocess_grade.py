@@ -1,7 +1,10 @@
 import os
 import json
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .processed_index import ProcessedIndex
 
 
 def join_comments(comments: List[str]) -> str:
@@ -27,13 +30,20 @@ def load_grade_log(path: str) -> Dict[str, Tuple[int, str]]:
         return {}
 
 
-def collect_student_results(processed_dir: str, total_questions: int):
+def collect_student_results(processed_dir: str, total_questions: int,
+                            index: Optional["ProcessedIndex"] = None):
     """
     遍历所有学生目录，检查批改完成情况，汇总成绩与评论。
+    提供 index 时先增量刷新索引，再一次性从索引读取学生列表与 grade.log。
     """
-    all_students = [d for d in os.listdir(processed_dir)
-                    if os.path.isdir(os.path.join(processed_dir, d))
-                    and not d.startswith(".") and d != "example"]
+    if index is not None:
+        index.refresh()
+        grade_logs = index.grade_logs()
+        all_students = [d for d in grade_logs if d != "example"]
+    else:
+        all_students = [d for d in os.listdir(processed_dir)
+                        if os.path.isdir(os.path.join(processed_dir, d))
+                        and not d.startswith(".") and d != "example"]
 
     warning_students = []
     results = []
@@ -43,7 +53,13 @@ def collect_student_results(processed_dir: str, total_questions: int):
 
     for idx, student in enumerate(sorted(all_students), start=1):
         log_path = os.path.join(processed_dir, student, "grade.log")
-        grade_log = load_grade_log(log_path)
+        if index is not None:
+            log_exists, grade_log = grade_logs[student]
+            if log_exists and grade_log is None:
+                print(f"⚠️ grade.log 格式损坏: {log_path}")
+            grade_log = grade_log or {}
+        else:
+            grade_log = load_grade_log(log_path)
 
         if not grade_log:
             warning_students.append(student)
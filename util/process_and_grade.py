@@ -0,0 +1,85 @@
+import os
+import time
+import asyncio
+from typing import Optional, Dict, List, TYPE_CHECKING
+
+from .check_file import is_marked_processed, migrate_processed_markers
+from .grade_sequence import grade_stream
+from .process_raw import process_raw, StudentJob
+
+if TYPE_CHECKING:
+    from llm.Agent import Agent
+    from .processed_index import ProcessedIndex
+
+async def process_and_grade(
+        grader: "Agent",
+        overlap_mode: bool = False,
+        raw_dir: str = "./data/raw",
+        processed_dir: str = "./data/processed",
+        tasks_dir: str = "./data/tasks",
+        workers: Optional[Dict[str, int]] = None,
+        index: Optional["ProcessedIndex"] = None) -> None:
+    """
+    边预处理边批改：每个学生通过预处理流水线后立即进入批改队列，
+    使 MATLAB 转换与 LLM 批改重叠进行，总耗时趋近 max(预处理, 批改) 而非二者之和。
+
+    Args:
+        grader: 用以批改的Agent
+        overlap_mode: 如果为 True，全部重新预处理并重新批改
+        raw_dir: 原始文件目录
+        processed_dir: 处理后文件输出目录
+        tasks_dir: 题目目录
+        workers: 预处理各阶段线程数（见 process_raw）
+        index: processed 目录索引；提供时通过索引查找已完成预处理的学生，预处理完成的学生由 validate 同步写入索引
+    """
+    loop = asyncio.get_running_loop()
+    students: asyncio.Queue = asyncio.Queue()
+    start = time.perf_counter()
+    preprocess_time = 0.0
+
+    # 已完成预处理的学生会被流水线跳过，直接进入批改队列；扫描在线程中进行，不阻塞事件循环
+    if not overlap_mode:
+        for student in await asyncio.to_thread(_processed_students, raw_dir, processed_dir, tasks_dir, index):
+            students.put_nowait(student)
+
+    def on_student_done(job: StudentJob) -> None:
+        loop.call_soon_threadsafe(students.put_nowait, job.name)
+
+    async def preprocess() -> None:
+        nonlocal preprocess_time
+        try:
+            await asyncio.to_thread(
+                process_raw,
+                overlap_mode=overlap_mode,
+                raw_dir=raw_dir,
+                processed_dir=processed_dir,
+                tasks_dir=tasks_dir,
+                workers=workers,
+                on_student_done=on_student_done,
+                index=index,
+            )
+        finally:
+            preprocess_time = time.perf_counter() - start
+            students.put_nowait(None)
+
+    await asyncio.gather(
+        preprocess(),
+        grade_stream(grader, students, processed_dir=processed_dir,
+                     overlap_mode=overlap_mode, tasks_dir=tasks_dir, index=index),
+    )
+
+    total_time = time.perf_counter() - start
+    print(f"\n⏱️ 预处理耗时 {preprocess_time:.2f}s，端到端耗时 {total_time:.2f}s")
+
+
+def _processed_students(raw_dir: str, processed_dir: str, tasks_dir: str,
+                        index: Optional["ProcessedIndex"] = None) -> List[str]:
+    """已通过预处理校验的学生；提供 index 时直接查询索引中的标记，不遍历学生文件夹"""
+    migrate_processed_markers(raw_dir=raw_dir, processed_dir=processed_dir, tasks_dir=tasks_dir, index=index)
+    if index is not None:
+        index.refresh()
+        return [student for student in index.students() if index.is_marked(student)]
+    if not os.path.isdir(processed_dir):
+        return []
+    return [student for student in sorted(os.listdir(processed_dir))
+            if is_marked_processed(os.path.join(processed_dir, student))]
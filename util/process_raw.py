@@ -1,63 +1,210 @@
 import os
 import re
-from typing import Optional, List, Tuple, Dict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional, List, Tuple, Dict, Iterator, Callable, TYPE_CHECKING
 
 from .mlx2others import mlx2others, matlab_engine
-from .check_file import check_process_correctness
-from .unzip_raw import unzip_and_flatten, move_and_rename_single_file
+from .check_file import (check_split_result, clear_processed_mark, count_task_number, is_marked_processed,
+                         mark_processed, migrate_processed_markers)
+from .unzip_raw import unzip_and_flatten, move_and_rename_single_file, student_name
+from .pipeline import Pipeline, Stage, format_report
+
+if TYPE_CHECKING:
+    from .processed_index import ProcessedIndex
+
+DEFAULT_WORKERS = {"extract": 2, "convert": 1, "split": 2, "attach-deps": 2, "validate": 1}
+
+@dataclass
+class StudentJob:
+    """在预处理流水线各阶段之间传递的单个学生的处理状态"""
+    name: str
+    raw_path: str
+    processed_path: str
+    mlx_count: int = 0
+    # (m文件所在目录, 转换得到的markdown路径)
+    md_files: List[Tuple[str, str]] = field(default_factory=list)
+    # markdown路径 -> [(题号, 代码块)]
+    questions: Dict[str, List[Tuple[int, str]]] = field(default_factory=dict)
+    # 输出目录 -> 已写出 answer.md 的题号
+    written: Dict[str, List[int]] = field(default_factory=dict)
+    valid: bool = False
 
 def process_raw(
         overlap_mode: bool = False,
         raw_dir: str = "./data/raw", 
-        processed_dir: str = "./data/processed") -> None:
+        processed_dir: str = "./data/processed",
+        tasks_dir: str = "./data/tasks",
+        workers: Optional[Dict[str, int]] = None,
+        queue_size: int = 8,
+        on_student_done: Optional[Callable[[StudentJob], None]] = None,
+        index: Optional["ProcessedIndex"] = None) -> None:
     """
-    批量处理原始目录中的MLX文件、
-    1. 将raw文件夹中压缩包解压缩 （详细逻辑在unzip_and_flatten）
-    2. 检查是否已经完成初始化（除非overlap_mode=True）（详细逻辑在check_process_correctness）
-    3. 转化为Markdown格式
-    4. 按照题号进行切分
+    以流水线方式批量处理原始目录中的MLX文件：
+    discover → extract → convert → split → attach-deps → validate
+    1. discover: 列出raw文件夹中的压缩包、单个mlx文件与学生文件夹，同一学生的提交按从新到旧归为一组
+    2. extract: 解压缩并整理结构（详细逻辑在unzip_and_flatten），最新的提交失败时依次尝试较早的提交；
+       已通过校验的学生直接跳过（除非overlap_mode=True）
+    3. convert: 转化为Markdown格式（每个工作线程独占一个MATLAB引擎）
+    4. split: 按照题号进行切分
+    5. attach-deps: 附加调用到的.m函数文件并写出answer.md
+    6. validate: 检查处理结果（详细逻辑在check_split_result），通过后写入标记文件，否则清除旧标记
+    开始前会对引入标记文件之前的处理结果做一次性迁移（见 migrate_processed_markers）。
+    每个阶段拥有独立的线程池与有界队列，结束后输出各阶段吞吐量与队列深度。
     
     Args:
+        overlap_mode: 如果为 True，忽略已有的处理结果，全部重新处理
         raw_dir: 原始文件目录
         processed_dir: 处理后文件输出目录
+        tasks_dir: 题目目录
+        workers: 各阶段线程数，未指定的阶段使用DEFAULT_WORKERS
+        queue_size: 阶段之间队列的最大长度
+        on_student_done: 每个学生通过 validate 阶段后的回调（在流水线工作线程中调用），用于边预处理边批改
+        index: processed 目录索引；提供时 validate 写入/清除标记后同步刷新该学生，之后的批改无需重新扫描
     """
-    for file in os.listdir(raw_dir):
-        if (file.endswith(".zip") or file.endswith(".rar")) and os.path.isfile(os.path.join(raw_dir, file)):
-            zip_path = os.path.join(raw_dir, file)
-            log_path = os.path.join(raw_dir, "unzip_warnings.log")
-            unzip_and_flatten(zip_path, log_path, processed_dir)
-        elif file.endswith(".mlx") and os.path.isfile(os.path.join(raw_dir, file)):
-            mlx_path = os.path.join(raw_dir, file)
-            move_and_rename_single_file(mlx_path, raw_dir, processed_dir)
-        
+    workers = {**DEFAULT_WORKERS, **(workers or {})}
+    task_number = count_task_number(tasks_dir)
+    log_path = os.path.join(raw_dir, "unzip_warnings.log")
+    warn_log_path = os.path.join(processed_dir, "process_warning.log")
+
+    def extract(submissions: List[Tuple[str, str]], _) -> Optional[StudentJob]:
+        # 按从新到旧依次尝试，成功整理出学生文件夹后才删除更早的提交
+        student_path = None
+        for i, (kind, path) in enumerate(submissions):
+            student_path = _extract_submission(kind, path, raw_dir, processed_dir, log_path)
+            if student_path is not None:
+                _remove_superseded(os.path.basename(student_path), submissions[i + 1:], path, log_path)
+                break
+        if student_path is None:
+            return None
 
-    with matlab_engine() as eng:
-        for root, dirs, files in os.walk(raw_dir):
+        name = os.path.basename(student_path)
+        processed_path = os.path.join(processed_dir, name)
+        if not overlap_mode and is_marked_processed(processed_path):
+            print(f"Skip {name}, already processed correctly.")
+            return None
+        return StudentJob(name=name, raw_path=student_path, processed_path=processed_path)
 
-            # check if alerady processed
-            subdir_name = os.path.relpath(root, raw_dir)
-            if subdir_name == '.': continue
-            if not overlap_mode and check_process_correctness(subdir_name):
-                print(f"Skip {subdir_name}, already processed correctly.")
-                continue
-            
+    def convert(job: StudentJob, eng) -> StudentJob:
+        for root, _, files in os.walk(job.raw_path):
             for file in files:
-                if file.endswith(".mlx"):
-                    mlx_input_path = os.path.join(root, file)
-                    relative_path = os.path.relpath(mlx_input_path, raw_dir)
-                    md_output_path = os.path.join(processed_dir, os.path.splitext(relative_path)[0] + ".md")
-                    
-                    os.makedirs(os.path.dirname(md_output_path), exist_ok=True)
-                    
-                    #1. 转化为markdown
-                    mlx2others(eng, mlx_input_path, md_output_path)
-
-                    #2. 切分markdown
-                    question_output_dir = os.path.dirname(md_output_path)
-                    split_by_question(root, md_output_path, question_output_dir)
-
-
-                    print(f"Processed {mlx_input_path} to {md_output_path}")
+                if not file.endswith(".mlx"):
+                    continue
+                mlx_input_path = os.path.join(root, file)
+                relative_path = os.path.relpath(mlx_input_path, raw_dir)
+                md_output_path = os.path.join(processed_dir, os.path.splitext(relative_path)[0] + ".md")
+
+                os.makedirs(os.path.dirname(md_output_path), exist_ok=True)
+                mlx2others(eng, mlx_input_path, md_output_path)
+
+                job.md_files.append((root, md_output_path))
+                if root == job.raw_path:
+                    job.mlx_count += 1
+                print(f"Processed {mlx_input_path} to {md_output_path}")
+        return job
+
+    def split(job: StudentJob, _) -> StudentJob:
+        for _, md_file in job.md_files:
+            job.questions[md_file] = _read_questions(md_file)
+        return job
+
+    def attach_deps(job: StudentJob, _) -> StudentJob:
+        for m_dir, md_file in job.md_files:
+            m_func_dict = _collect_m_function_files(m_dir)
+            questions = [(question_num, _append_m_dependencies(code_block, m_func_dict))
+                         for (question_num, code_block) in job.questions[md_file]]
+            output_dir = os.path.normpath(os.path.dirname(md_file))
+            job.written.setdefault(output_dir, []).extend(_write_answers(questions, output_dir))
+        return job
+
+    def validate(job: StudentJob, _) -> StudentJob:
+        question_nums = job.written.get(os.path.normpath(job.processed_path), [])
+        job.valid = check_split_result(job.mlx_count, question_nums, task_number)
+        if job.valid:
+            mark_processed(job.processed_path)
+        else:
+            # 重新处理（overlap_mode）后不再合规的学生需要清除旧标记，否则之后会被当作已处理而跳过
+            clear_processed_mark(job.processed_path)
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            record = (f"[{now}] 学生 {job.name} 预处理结果不合规: "
+                      f"mlx文件 {job.mlx_count} 个, 切分题目 {sorted(question_nums)}, 应有 {task_number} 题\n")
+            print(f"⚠️ {record.strip()}")
+            with open(warn_log_path, "a", encoding="utf-8") as f:
+                f.write(record)
+        if index is not None:
+            index.refresh_student(job.name)
+        return job
+
+    pipeline = Pipeline(
+        stages=[
+            Stage("extract", extract, workers["extract"]),
+            Stage("convert", convert, workers["convert"], context_factory=matlab_engine),
+            Stage("split", split, workers["split"]),
+            Stage("attach-deps", attach_deps, workers["attach-deps"]),
+            Stage("validate", validate, workers["validate"]),
+        ],
+        queue_size=queue_size,
+        sink=on_student_done,
+    )
+    os.makedirs(processed_dir, exist_ok=True)
+    migrate_processed_markers(raw_dir=raw_dir, processed_dir=processed_dir, tasks_dir=tasks_dir, index=index)
+    stats = pipeline.run(_discover(raw_dir))
+    print(format_report(stats, pipeline.wall_time, title="预处理流水线统计"))
+
+
+def _discover(raw_dir: str) -> Iterator[List[Tuple[str, str]]]:
+    """
+    discover 阶段：列出raw文件夹中待处理的对象，每个学生产出一组按从新到旧排列的 (类型, 路径)，
+    类型为 archive / file / dir。压缩包与单个mlx文件会被整理为同名学生文件夹，因此同一学生的
+    所有提交（以及已有的同名文件夹）放在同一组中由一个 extract 线程依次尝试，避免并发重建同一个文件夹。
+    """
+    submissions: Dict[str, List[Tuple[str, str]]] = {}
+    dirs: Dict[str, str] = {}
+    for file in sorted(os.listdir(raw_dir)):
+        path = os.path.join(raw_dir, file)
+        if os.path.isdir(path):
+            dirs[file] = path
+        elif file.endswith(".zip") or file.endswith(".rar"):
+            submissions.setdefault(student_name(os.path.splitext(file)[0]), []).append(("archive", path))
+        elif file.endswith(".mlx"):
+            submissions.setdefault(student_name(file), []).append(("file", path))
+
+    for name, items in submissions.items():
+        items.sort(key=lambda item: (os.path.getmtime(item[1]), item[1]), reverse=True)
+        # 所有提交都无法整理时，退回到已有的学生文件夹
+        if name in dirs:
+            items.append(("dir", dirs.pop(name)))
+        yield items
+
+    for path in dirs.values():
+        yield [("dir", path)]
+
+
+def _extract_submission(kind: str, path: str, raw_dir: str, processed_dir: str, log_path: str) -> Optional[str]:
+    """整理单份提交，返回学生文件夹路径；失败时返回 None"""
+    if kind == "archive":
+        return unzip_and_flatten(path, log_path, processed_dir)
+    if kind == "file":
+        try:
+            return os.path.dirname(move_and_rename_single_file(path, raw_dir, processed_dir))
+        except Exception as e:
+            print(f"❌ 整理失败: {path} - {e}")
+            return None
+    return path
+
+
+def _remove_superseded(name: str, superseded: List[Tuple[str, str]], kept: str, log_path: str) -> None:
+    """删除已被更新的提交取代的压缩包 / mlx 文件（保留学生文件夹），并记录到日志"""
+    for kind, path in superseded:
+        if kind == "dir":
+            continue
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        record = (f"[{now}] ⚠️ 学生 {name} 有多份提交，已使用 {os.path.basename(kept)}，"
+                  f"删除较早的 {os.path.basename(path)}\n")
+        print(record.strip())
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(record)
+        os.remove(path)
     
 
 def split_by_question(m_dir: str, md_file: str, output_dir: str) -> None:
@@ -69,17 +216,30 @@ def split_by_question(m_dir: str, md_file: str, output_dir: str) -> None:
         md_file: 输入的markdown文件路径
         output_dir: 输出目录路径
     """
-    # 读取markdown文件内容
-    with open(md_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
     # 提取所有题目内容
-    questions: List[Tuple[int, str]] = _extract_questions(content)
+    questions: List[Tuple[int, str]] = _read_questions(md_file)
     m_func_dict: Dict[str,str] = _collect_m_function_files(m_dir)
     questions = [(question_num, _append_m_dependencies(code_block,m_func_dict))
                   for (question_num, code_block) in questions]
     
-    # 为每个题目创建目录并保存文件
+    _write_answers(questions, output_dir)
+
+
+def _read_questions(md_file: str) -> List[Tuple[int, str]]:
+    """读取markdown文件并提取所有题目内容"""
+    with open(md_file, 'r', encoding='utf-8') as f:
+        content = f.read()
+    return _extract_questions(content)
+
+
+def _write_answers(questions: List[Tuple[int, str]], output_dir: str) -> List[int]:
+    """
+    为每个题目创建目录并保存answer.md
+
+    Returns:
+        成功写出的题号列表
+    """
+    written = []
     for question_num, code_block in questions:
         question_dir = os.path.join(output_dir, str(question_num))
         os.makedirs(question_dir, exist_ok=True)
@@ -87,6 +247,8 @@ def split_by_question(m_dir: str, md_file: str, output_dir: str) -> None:
         answer_file = os.path.join(question_dir, "answer.md")
         with open(answer_file, 'w', encoding='utf-8') as f:
             f.write(code_block.strip())
+        written.append(question_num)
+    return written
 
 
 def _extract_questions(content: str) -> List[Tuple[int, str]]:
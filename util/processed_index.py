@@ -0,0 +1,264 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .check_file import PROCESSED_MARKER
+
+# 表结构变化时递增；版本不一致的索引文件会被清空重建（索引只是缓存）
+_SCHEMA_VERSION = 2
+
+_SCHEMA = [
+    """
+CREATE TABLE IF NOT EXISTS students (
+    name          TEXT PRIMARY KEY,
+    dir_mtime     INTEGER NOT NULL,
+    q_mtimes      TEXT NOT NULL DEFAULT '{}',
+    log_mtime     INTEGER,
+    marked        INTEGER NOT NULL DEFAULT 0,
+    questions     TEXT NOT NULL DEFAULT '[]',
+    grade_log     TEXT,
+    missing_count INTEGER,
+    total         REAL
+)
+""",
+]
+
+_UPSERT_STUDENT = ("INSERT OR REPLACE INTO students (name, dir_mtime, q_mtimes, log_mtime, marked, questions, "
+                   "grade_log, missing_count, total) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+_UPDATE_GRADE_LOG = ("UPDATE students SET log_mtime = ?, grade_log = ?, missing_count = ?, total = ? "
+                     "WHERE name = ?")
+
+
+class ProcessedIndex:
+    """
+    processed 目录的持久化索引（SQLite，启用 mmap 读取），避免在大规模课程中反复遍历目录。
+
+    每个学生记录：文件夹与各题目文件夹的 mtime、是否已通过预处理校验（.processed 标记）、含 answer.md 的题号、
+    grade.log 内容及其 mtime、未批改题数与当前总分。
+
+    索引由写入方维护：预处理在写入/删除 .processed 标记后调用 refresh_student，GradeSession 写 grade.log 时
+    调用 update_grade_log。refresh() 只需一次 os.scandir，学生文件夹 mtime 变化（新增/删除题目文件夹、
+    标记文件，或以替换方式重写 grade.log）时重新扫描该学生。
+    refresh(deep=True) 额外检查各题目文件夹与 grade.log 的 mtime（每个学生 Q+1 次 stat），
+    用于发现绕过索引的修改，例如手动增删 answer.md 或直接编辑 grade.log。
+
+    Args:
+        processed_dir: 处理后文件目录
+        index_path: 索引文件路径，默认 <processed_dir>/.index.sqlite
+    """
+
+    def __init__(self, processed_dir: str = "./data/processed", index_path: Optional[str] = None):
+        self.processed_dir = processed_dir
+        self.index_path = index_path or os.path.join(processed_dir, ".index.sqlite")
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        # 不使用 WAL，以兼容网络文件系统
+        self._conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._conn.execute("PRAGMA mmap_size = 268435456")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        with self._conn:
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+                self._conn.execute("DROP TABLE IF EXISTS students")
+                self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "ProcessedIndex":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def refresh(self, deep: bool = False) -> Dict[str, int]:
+        """
+        增量更新索引
+
+        Args:
+            deep: 是否同时检查未变化学生的题目文件夹与 grade.log 的 mtime
+
+        Returns:
+            {"students": 学生数, "rescanned": 重新扫描的学生数, "logs": 重新读取的 grade.log 数, "removed": 删除的学生数}
+        """
+        with self._lock:
+            if deep:
+                known = {name: (dir_mtime, json.loads(q_mtimes), log_mtime) for name, dir_mtime, q_mtimes, log_mtime
+                         in self._conn.execute("SELECT name, dir_mtime, q_mtimes, log_mtime FROM students")}
+            else:
+                known = {name: (dir_mtime,) for name, dir_mtime
+                         in self._conn.execute("SELECT name, dir_mtime FROM students")}
+        seen = set()
+        stats = {"students": 0, "rescanned": 0, "logs": 0, "removed": 0}
+        rows = []
+        log_rows = []
+
+        with os.scandir(self.processed_dir) as it:
+            for entry in it:
+                if entry.name.startswith(".") or not entry.is_dir():
+                    continue
+                seen.add(entry.name)
+                dir_mtime = entry.stat().st_mtime_ns
+                old = known.get(entry.name)
+
+                if old is None or old[0] != dir_mtime or (deep and _questions_changed(entry.path, old[1])):
+                    rows.append(self._scan_student(entry.name, entry.path, dir_mtime))
+                    stats["rescanned"] += 1
+                elif deep:
+                    log_mtime = _mtime(os.path.join(entry.path, "grade.log"))
+                    if log_mtime != old[2]:
+                        log_rows.append(_grade_row(entry.name, log_mtime, _load_grade_log(entry.path)))
+                        stats["logs"] += 1
+
+        removed = [name for name in known if name not in seen]
+        with self._lock, self._conn:
+            self._conn.executemany(_UPSERT_STUDENT, rows)
+            self._conn.executemany(_UPDATE_GRADE_LOG, log_rows)
+            self._conn.executemany("DELETE FROM students WHERE name = ?", [(name,) for name in removed])
+
+        stats["students"] = len(seen)
+        stats["removed"] = len(removed)
+        return stats
+
+    def refresh_student(self, student: str) -> None:
+        """重新扫描单个学生（预处理写入或删除标记后调用）；学生文件夹已不存在时移除记录"""
+        path = os.path.join(self.processed_dir, student)
+        if not os.path.isdir(path):
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM students WHERE name = ?", (student,))
+            return
+        row = self._scan_student(student, path, os.stat(path).st_mtime_ns)
+        with self._lock, self._conn:
+            self._conn.execute(_UPSERT_STUDENT, row)
+
+    def has_student(self, student: str) -> bool:
+        return self._fetch_one("SELECT 1 FROM students WHERE name = ?", student) is not None
+
+    def students(self) -> List[str]:
+        with self._lock:
+            return [name for (name,) in self._conn.execute("SELECT name FROM students ORDER BY name")]
+
+    def question_dirs(self, student: str) -> List[str]:
+        """学生文件夹下的题目文件夹名（无论是否含 answer.md）"""
+        row = self._fetch_one("SELECT q_mtimes FROM students WHERE name = ?", student)
+        return list(json.loads(row[0])) if row else []
+
+    def questions(self, student: str) -> List[str]:
+        """含 answer.md 的题号（字符串，按数值排序）"""
+        row = self._fetch_one("SELECT questions FROM students WHERE name = ?", student)
+        return json.loads(row[0]) if row else []
+
+    def is_marked(self, student: str) -> bool:
+        row = self._fetch_one("SELECT marked FROM students WHERE name = ?", student)
+        return bool(row and row[0])
+
+    def grade_log(self, student: str) -> Tuple[bool, Optional[Dict]]:
+        """
+        Returns:
+            (grade.log 是否存在, 解析后的内容)；文件存在但格式损坏时内容为 None
+        """
+        row = self._fetch_one("SELECT log_mtime, grade_log FROM students WHERE name = ?", student)
+        if not row or row[0] is None:
+            return False, None
+        return True, (json.loads(row[1]) if row[1] is not None else None)
+
+    def grade_logs(self) -> Dict[str, Tuple[bool, Optional[Dict]]]:
+        """所有学生的 grade_log(student)，一次查询取出（汇总成绩时避免逐个学生查询）"""
+        with self._lock:
+            rows = self._conn.execute("SELECT name, log_mtime, grade_log FROM students").fetchall()
+        return {name: (log_mtime is not None, json.loads(grade_log) if grade_log is not None else None)
+                for name, log_mtime, grade_log in rows}
+
+    def update_grade_log(self, student: str, grade_log: Dict) -> None:
+        """
+        在写入 grade.log 后同步更新索引（写穿），避免下次 refresh 重新读取。
+        grade.log 以替换方式写入，会改变学生文件夹的 mtime，因此一并记录新的 mtime。
+        """
+        student_path = os.path.join(self.processed_dir, student)
+        log_mtime = _mtime(os.path.join(student_path, "grade.log"))
+        with self._lock, self._conn:
+            self._conn.execute(_UPDATE_GRADE_LOG, _grade_row(student, log_mtime, grade_log))
+            dir_mtime = _mtime(student_path)
+            if dir_mtime is not None:
+                self._conn.execute("UPDATE students SET dir_mtime = ? WHERE name = ?", (dir_mtime, student))
+
+    def status(self) -> Dict[str, int]:
+        """
+        课程整体状态（仅查询索引，不访问 processed 目录）
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(marked), 0), "
+                "COALESCE(SUM(grade_log IS NOT NULL AND missing_count = 0), 0), "
+                "COALESCE(SUM(log_mtime IS NULL OR grade_log IS NULL OR missing_count > 0), 0), "
+                "COALESCE(SUM(COALESCE(missing_count, 0)), 0) FROM students"
+            ).fetchone()
+        keys = ["students", "preprocessed", "fully_graded", "incomplete", "missing_questions"]
+        return dict(zip(keys, row))
+
+    def _fetch_one(self, sql: str, *params):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    @staticmethod
+    def _scan_student(name: str, path: str, dir_mtime: int) -> tuple:
+        questions = []
+        q_mtimes = {}
+        marked = False
+        log_mtime = None
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir() and entry.name.isdigit():
+                    q_mtimes[entry.name] = entry.stat().st_mtime_ns
+                    if os.path.isfile(os.path.join(entry.path, "answer.md")):
+                        questions.append(entry.name)
+                elif entry.name == PROCESSED_MARKER:
+                    marked = True
+                elif entry.name == "grade.log":
+                    log_mtime = entry.stat().st_mtime_ns
+
+        grade_log = _load_grade_log(path) if log_mtime is not None else None
+        missing_count, total = _grade_state(grade_log)
+        return (name, dir_mtime, json.dumps(q_mtimes), log_mtime, int(marked),
+                json.dumps(sorted(questions, key=int)),
+                None if grade_log is None else json.dumps(grade_log, ensure_ascii=False),
+                missing_count, total)
+
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _questions_changed(student_path: str, q_mtimes: Dict[str, int]) -> bool:
+    """题目文件夹的 mtime 是否变化（answer.md 新增或删除不会改变学生文件夹本身的 mtime）"""
+    return any(_mtime(os.path.join(student_path, qid)) != mtime for qid, mtime in q_mtimes.items())
+
+
+def _load_grade_log(student_path: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(student_path, "grade.log"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _grade_row(student: str, log_mtime: Optional[int], grade_log: Optional[Dict]) -> tuple:
+    missing_count, total = _grade_state(grade_log)
+    return (log_mtime, None if grade_log is None else json.dumps(grade_log, ensure_ascii=False),
+            missing_count, total, student)
+
+
+def _grade_state(grade_log: Optional[Dict]) -> Tuple[Optional[int], Optional[float]]:
+    """(未批改题数, 当前总分)"""
+    if grade_log is None:
+        return None, None
+    missing = sum(1 for score, _ in grade_log.values() if score is None)
+    total = sum(score for score, _ in grade_log.values() if isinstance(score, (int, float)))
+    return missing, total
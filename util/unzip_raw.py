@@ -1,17 +1,22 @@
 import os
 import zipfile
-import rarfile
-rarfile.UNRAR_TOOL = r".\UnRAR.exe"
 import shutil
 from datetime import datetime
+from typing import Optional
 
-def unzip_and_flatten(archive_path: str, log_path: str, processed_dir: str) -> None:
+# rarfile 仅在解压 .rar 时导入；可通过环境变量 UNRAR_TOOL 指定 UnRAR 可执行文件
+UNRAR_TOOL = os.getenv("UNRAR_TOOL") or (r".\UnRAR.exe" if os.name == "nt" else "unrar")
+
+def unzip_and_flatten(archive_path: str, log_path: str, processed_dir: str) -> Optional[str]:
     """
     解压并整理结构，支持 zip / rar。
+
+    Returns:
+        整理后的学生文件夹路径；未解压（失败或解压目录已存在）时返回 None
     """
     if not os.path.isfile(archive_path):
         print(f"Error: {archive_path} 不存在或不是文件。")
-        return
+        return None
 
     archive_dir = os.path.dirname(archive_path)
     archive_name = os.path.splitext(os.path.basename(archive_path))[0]
@@ -21,14 +26,14 @@ def unzip_and_flatten(archive_path: str, log_path: str, processed_dir: str) -> N
     if os.path.exists(extract_dir):
         os.remove(archive_path)
         print(f"🗑️ 已删除原始压缩文件（解压目录已存在）: {archive_path}")
-        return
+        return None
 
     # Step 1: 解压
     try:
         extract_archive(archive_path, extract_dir)
     except Exception as e:
         print(f"❌ 解压失败: {archive_path} - {e}")
-        return
+        return None
     print(f"✅ 已解压: {extract_dir}")
 
     # Step 2: 重命名文件夹
@@ -41,6 +46,7 @@ def unzip_and_flatten(archive_path: str, log_path: str, processed_dir: str) -> N
     # Step 4: 删除原始压缩包
     os.remove(archive_path)
     print(f"🗑️ 已删除原始压缩文件: {archive_path}")
+    return new_dir
 
 
 def extract_archive(archive_path: str, extract_dir: str) -> None:
@@ -53,6 +59,8 @@ def extract_archive(archive_path: str, extract_dir: str) -> None:
         with zipfile.ZipFile(archive_path, 'r') as zf:
             zf.extractall(extract_dir)
     elif ext == ".rar":
+        import rarfile
+        rarfile.UNRAR_TOOL = UNRAR_TOOL
         with rarfile.RarFile(archive_path, 'r') as rf:
             rf.extractall(extract_dir)
     else:
@@ -87,9 +95,13 @@ def flatten_directory(target_dir: str, log_path: str, zip_name: str) -> None:
         with open(log_path, "a", encoding="utf-8") as log_file:
             log_file.write(warning_msg)
 
+def student_name(base_name: str) -> str:
+    """由压缩包名（不含扩展名）或单个文件名提取学生文件夹名"""
+    return base_name.split('_', 1)[0]
+
 def _rename_and_prepare_dirs(base_name: str, archive_dir: str, processed_dir: str) -> (str, str):
     """公共内部工具函数：提取新名字，并在raw和processed中新建文件夹。如果输入为文件夹，直接重命名。"""
-    new_name = base_name.split('_', 1)[0]
+    new_name = student_name(base_name)
     new_dir = os.path.join(archive_dir, new_name)
     if os.path.exists(new_dir):
         shutil.rmtree(new_dir)